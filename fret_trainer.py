@@ -2,18 +2,35 @@
 # -*- coding: utf-8 -*-
 
 import csv
-import json
 import os
 import random
 import time
 import tkinter as tk
-from dataclasses import asdict, dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 from datetime import datetime
 from tkinter import ttk, messagebox
 
+# best.json の読み書き：orjson があれば使う（無ければ標準 json。出力はどちらも UTF-8 / インデント2）
+try:
+    import orjson
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+    _json_loads = json.loads
+
 # ===== 音名・チューニング =====
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
 OPEN_STRINGS = {6: "E", 5: "A", 4: "D", 3: "G", 2: "B", 1: "E"}
+_NOTE_TO_PC = {n: i for i, n in enumerate(NOTE_NAMES)}
 
 # ===== ログ保存 =====
 LOG_DIR = "fret_trainer_logs"
@@ -21,24 +38,43 @@ SUMMARY_CSV = os.path.join(LOG_DIR, "summary.csv")
 QUESTIONS_CSV = os.path.join(LOG_DIR, "questions.csv")
 BEST_JSON = os.path.join(LOG_DIR, "best.json")
 
+# 回答後に次の問題へ進むまでの待ち（ms）。正解は即次へ、MISS/PASS は正解を読む時間を残す
+CORRECT_DELAY_MS = 0
+MISS_DELAY_MS = 200
+
+# 経過時間・反応時間の計測用（単調増加・高分解能）。日時表示は datetime を使う
+_now = time.perf_counter
+
+# ヘッダ書き込み済み（＝ファイルが存在する）と分かっているCSVパス
+_HEADERED_PATHS: set[str] = set()
+
 def ensure_log_dir():
     os.makedirs(LOG_DIR, exist_ok=True)
 
 def note_to_pc(note: str) -> int:
-    note = note.strip().upper()
-    if note not in NOTE_NAMES:
+    pc = _NOTE_TO_PC.get(note.strip().upper())
+    if pc is None:
         raise ValueError(note)
-    return NOTE_NAMES.index(note)
+    return pc
 
 def pc_to_note(pc: int) -> str:
     return NOTE_NAMES[pc % 12]
 
-def calc_note(string_no: int, fret: int) -> str:
-    base = note_to_pc(OPEN_STRINGS[string_no])
-    return pc_to_note(base + fret)
+# (弦, フレット) → 音名 を起動時に前計算（フレット上限24まで）
+NOTE_TABLE = tuple(
+    tuple(pc_to_note(note_to_pc(OPEN_STRINGS[s]) + f) for f in range(25))
+    for s in range(1, 7)
+)
+# 出題ラベルの「6弦  0f は？」部分も同様に前計算
+Q_TEXT_TABLE = tuple(
+    tuple(f"{s}弦  {f}f は？" for f in range(25))
+    for s in range(1, 7)
+)
+
+_SHARP_TRANS = str.maketrans({"♯": "#"})
 
 def normalize_answer(s: str) -> str:
-    return s.strip().upper().replace("♯", "#")
+    return s.strip().upper().translate(_SHARP_TRANS)
 
 def grade(correct: int, total: int) -> str:
     if total <= 0:
@@ -49,7 +85,7 @@ def grade(correct: int, total: int) -> str:
     if r >= 0.6: return "B"
     return "C"
 
-@dataclass
+@dataclass(slots=True)
 class QuestionRecord:
     session_id: str
     q_index: int
@@ -61,7 +97,7 @@ class QuestionRecord:
     is_pass: int      # 1/0
     response_time_sec: float
 
-@dataclass
+@dataclass(slots=True)
 class SessionSummary:
     session_id: str
     timestamp_local: str
@@ -78,10 +114,19 @@ class SessionSummary:
     avg_sec_per_q: float
     grade: str
 
+# CSV列順（dataclass の定義順）。asdict() の deepcopy を避けて列順どおりの行 tuple を作る
+_QR_FIELDS = tuple(f.name for f in fields(QuestionRecord))
+_SS_FIELDS = tuple(f.name for f in fields(SessionSummary))
+
+def _to_row(rec, names: tuple[str, ...]) -> tuple:
+    return tuple(getattr(rec, n) for n in names)
+
+_UNSET = object()  # ベストキャッシュ未ロードの印
+
 def read_best():
     try:
-        with open(BEST_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(BEST_JSON, "rb") as f:
+            return _json_loads(f.read())
     except FileNotFoundError:
         return None
     except Exception:
@@ -89,17 +134,28 @@ def read_best():
 
 def write_best(best_obj: dict):
     ensure_log_dir()
-    with open(BEST_JSON, "w", encoding="utf-8") as f:
-        json.dump(best_obj, f, ensure_ascii=False, indent=2)
+    with open(BEST_JSON, "wb") as f:
+        f.write(_json_dumps(best_obj))
 
-def append_csv(path: str, fieldnames: list[str], row: dict):
+def append_csv(path: str, fieldnames: tuple[str, ...], row: tuple):
     ensure_log_dir()
-    file_exists = os.path.exists(path)
+    need_header = path not in _HEADERED_PATHS and not os.path.exists(path)
     with open(path, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        if not file_exists:
-            w.writeheader()
+        w = csv.writer(f)
+        if need_header:
+            w.writerow(fieldnames)
         w.writerow(row)
+    _HEADERED_PATHS.add(path)
+
+def append_csv_rows(path: str, fieldnames: tuple[str, ...], rows: list[tuple]):
+    ensure_log_dir()
+    need_header = path not in _HEADERED_PATHS and not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if need_header:
+            w.writerow(fieldnames)
+        w.writerows(rows)
+    _HEADERED_PATHS.add(path)
 
 def is_new_best(candidate: dict, best: dict | None) -> bool:
     """
@@ -138,11 +194,24 @@ class FretTrainerUI(tk.Tk):
         self.current = None  # (s, f, ans)
 
         self.wrong_pool = []     # list[(s,f,ans)] for review mode
+        self._wrong_count = 0    # 通常モードの間違い数（= len(wrong_pool)）
         self.records: list[QuestionRecord] = []
 
         self.session_id = None
         self.review_mode = False
         self.review_queue = []
+        self.question_script: list[tuple[int, int, str]] = []
+
+        # 表示中のステータス文字列（変化がなければ configure しない）
+        self._stat_text: dict[str, str] = {}
+
+        # best.json の内容（このプロセスだけが書くので、書いたときに差し替える）
+        self._best_cache = _UNSET
+
+        # ディスク書き込み用（UIスレッドを止めない。1本なので追記順は保たれる）
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fret-io")
+        self._io_pending = 0  # 完了通知をまだ処理していない保存の数
+        self._closing = False
 
         self._build_ui()
         self._set_idle()
@@ -203,14 +272,16 @@ class FretTrainerUI(tk.Tk):
         # ===== Best =====
         best_frame = ttk.LabelFrame(root, text="ベスト記録（起動時/終了時に更新）", padding=10)
         best_frame.pack(fill="x", pady=(10, 0))
-        self.best_label = ttk.Label(best_frame, text="ベスト: -", font=("Helvetica", 12, "bold"))
+        self.best_var = tk.StringVar(value="ベスト: -")
+        self.best_label = ttk.Label(best_frame, textvariable=self.best_var, font=("Helvetica", 12, "bold"))
         self.best_label.pack(anchor="w")
 
         # ===== Question =====
         qbox = ttk.LabelFrame(root, text="出題", padding=10)
         qbox.pack(fill="x", pady=(10, 0))
 
-        self.q_label = ttk.Label(qbox, text="開始を押してください", font=("Helvetica", 22, "bold"))
+        self.q_var = tk.StringVar(value="開始を押してください")
+        self.q_label = ttk.Label(qbox, textvariable=self.q_var, font=("Helvetica", 22, "bold"))
         self.q_label.pack(anchor="w")
 
         ans_row = ttk.Frame(qbox)
@@ -227,20 +298,25 @@ class FretTrainerUI(tk.Tk):
         self.pass_btn = ttk.Button(ans_row, text="パス", command=self.pass_q)
         self.pass_btn.pack(side="left", padx=(8, 0))
 
-        self.feedback = ttk.Label(qbox, text="", font=("Helvetica", 12))
+        self.feedback_var = tk.StringVar(value="")
+        self.feedback = ttk.Label(qbox, textvariable=self.feedback_var, font=("Helvetica", 12))
         self.feedback.pack(anchor="w", pady=(8, 0))
 
         # ===== Status + log =====
         stat = ttk.Frame(root, padding=(0, 10))
         stat.pack(fill="x")
 
-        self.progress = ttk.Label(stat, text="進捗: -", font=("Helvetica", 12, "bold"))
+        self.progress_var = tk.StringVar(value="進捗: -")
+        self.progress = ttk.Label(stat, textvariable=self.progress_var, font=("Helvetica", 12, "bold"))
         self.progress.pack(side="left")
-        self.score = ttk.Label(stat, text="正解: -", font=("Helvetica", 12, "bold"))
+        self.score_var = tk.StringVar(value="正解: -")
+        self.score = ttk.Label(stat, textvariable=self.score_var, font=("Helvetica", 12, "bold"))
         self.score.pack(side="left", padx=(20, 0))
-        self.timer = ttk.Label(stat, text="経過: -", font=("Helvetica", 12, "bold"))
+        self.timer_var = tk.StringVar(value="経過: -")
+        self.timer = ttk.Label(stat, textvariable=self.timer_var, font=("Helvetica", 12, "bold"))
         self.timer.pack(side="left", padx=(20, 0))
-        self.wrong_label = ttk.Label(stat, text="間違い: -", font=("Helvetica", 12, "bold"))
+        self.wrong_var = tk.StringVar(value="間違い: -")
+        self.wrong_label = ttk.Label(stat, textvariable=self.wrong_var, font=("Helvetica", 12, "bold"))
         self.wrong_label.pack(side="left", padx=(20, 0))
 
         log_frame = ttk.LabelFrame(root, text="ログ（セッション完走で自動保存）", padding=10)
@@ -250,12 +326,31 @@ class FretTrainerUI(tk.Tk):
         self.log.configure(state="disabled")
 
         self.bind("<Escape>", lambda e: self.stop())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        if self._closing:
+            return  # 閉じる途中にもう一度 × が押された（待ち合わせ中の update から再入する）
+        self._closing = True
+        # 書き込みを待つ間の入力（Enter で回答など）は無視する：先に隠し、出題中なら中断扱いにする
+        # （submit/pass/stop は in_quiz を、start は _closing を見て何もしない）
+        self.withdraw()
+        self.in_quiz = False
+        # 書き込み待ちの保存を終えてから閉じる。
+        # 完了通知は I/O スレッドから after で届くので、Tk のイベントを回しながら待つ
+        # （ここで shutdown(wait=True) だけをすると、after を待つ I/O スレッドと互いに待ち合う）
+        while self._io_pending:
+            self.update()
+            time.sleep(0.01)
+        self._io_pool.shutdown(wait=True)
+        self.destroy()
 
     def log_append(self, s: str):
+        # 状態の切り替えは追記1回につき1往復だけ（ログは呼び出し側で1本にまとめる）
         self.log.configure(state="normal")
         self.log.insert("end", s)
-        self.log.see("end")
         self.log.configure(state="disabled")
+        self.log.see("end")
 
     def select_all_strings(self):
         for v in self.string_vars.values():
@@ -267,12 +362,13 @@ class FretTrainerUI(tk.Tk):
 
     def _set_idle(self):
         self.in_quiz = False
-        self.q_label.configure(text="開始を押してください")
-        self.feedback.configure(text="")
-        self.progress.configure(text="進捗: -")
-        self.score.configure(text="正解: -")
-        self.timer.configure(text="経過: -")
-        self.wrong_label.configure(text="間違い: -")
+        self.q_var.set("開始を押してください")
+        self.feedback_var.set("")
+        self.progress_var.set("進捗: -")
+        self.score_var.set("正解: -")
+        self.timer_var.set("経過: -")
+        self.wrong_var.set("間違い: -")
+        self._stat_text.clear()
         self.ans_var.set("")
         self.ans_entry.configure(state="disabled")
         self.submit_btn.configure(state="disabled")
@@ -318,23 +414,26 @@ class FretTrainerUI(tk.Tk):
         return enabled_strings, total, limit, fret_max, mode
 
     # -------- best display --------
+    def _get_best(self):
+        if self._best_cache is _UNSET:
+            self._best_cache = read_best()
+        return self._best_cache
+
     def _show_best_on_start(self):
-        best = read_best()
+        best = self._get_best()
         if not best:
-            self.best_label.configure(text="ベスト: （まだ記録がありません）")
+            self.best_var.set("ベスト: （まだ記録がありません）")
             return
-        self.best_label.configure(
-            text=(
-                f"ベスト: 正解 {best['correct']}/{best['total_q']}  "
-                f"平均 {best['avg_sec_per_q']:.2f}s/問  "
-                f"合計 {best['elapsed_sec']:.2f}s  "
-                f"({best['timestamp_local']})"
-            )
+        self.best_var.set(
+            f"ベスト: 正解 {best['correct']}/{best['total_q']}  "
+            f"平均 {best['avg_sec_per_q']:.2f}s/問  "
+            f"合計 {best['elapsed_sec']:.2f}s  "
+            f"({best['timestamp_local']})"
         )
 
     # -------- session control --------
     def start(self):
-        if self.in_quiz:
+        if self.in_quiz or self._closing:
             return
 
         try:
@@ -362,16 +461,36 @@ class FretTrainerUI(tk.Tk):
         self.time_limit = limit
         self.fret_max = fret_max
 
+        # 出題用の乱数（セッション専用。seed を渡せば再現可能）
+        self._rng = random.Random()
+        self._rand_choice = self._rng.choice
+        self._rand_randrange = self._rng.randrange
+
+        # 出題リストを開始時にまとめて作る（復習は review_queue をそのまま使う）
+        if self.review_mode:
+            self.question_script = self.review_queue
+        else:
+            self.question_script = []
+            for _ in range(self.total_q):
+                s = self._rand_choice(self.enabled_strings)
+                f = self._rand_randrange(self.fret_max + 1)
+                self.question_script.append((s, f, NOTE_TABLE[s - 1][f]))
+
+        # 「[復習] Q1: 」部分をセッション分まとめて作っておく
+        tag = "[復習] " if self.review_mode else ""
+        self._q_prefixes = [f"{tag}Q{i}: " for i in range(self.total_q + 1)]
+
         self.q_index = 0
         self.correct = 0
         self.passed = 0
         self.records = []
         if not self.review_mode:
             self.wrong_pool = []
+        self._wrong_count = 0
 
         # session id
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.session_start = time.time()
+        self.session_start = _now()
 
         self.log_append(f"\n=== セッション開始 [{self.session_id}] mode={self.mode} ===\n")
         self._set_running()
@@ -393,18 +512,12 @@ class FretTrainerUI(tk.Tk):
             self.finish_and_save()
             return
 
-        if self.review_mode:
-            s, f, a = self.review_queue[self.q_index - 1]
-        else:
-            s = random.choice(self.enabled_strings)
-            f = random.randint(0, self.fret_max)
-            a = calc_note(s, f)
+        s, f, a = self.question_script[self.q_index - 1]
 
         self.current = (s, f, a)
-        self.q_start = time.time()
-        tag = "[復習] " if self.review_mode else ""
-        self.q_label.configure(text=f"{tag}Q{self.q_index}: {s}弦  {f}f は？")
-        self.feedback.configure(text="")
+        self.q_start = _now()
+        self.q_var.set(self._q_prefixes[self.q_index] + Q_TEXT_TABLE[s - 1][f])
+        self.feedback_var.set("")
         self.ans_var.set("")
         self._update_stat()
 
@@ -414,19 +527,20 @@ class FretTrainerUI(tk.Tk):
 
         s, f, a = self.current
         user = normalize_answer(self.ans_var.get())
-        rt = time.time() - self.q_start
+        rt = _now() - self.q_start
 
         is_pass = 0
         is_correct = 1 if user == a else 0
         if is_correct:
             self.correct += 1
-            self.feedback.configure(text=f"OK  ({rt:.2f}s)")
+            self.feedback_var.set(f"OK  ({rt:.2f}s)")
             self.log_append(f"OK  : {s}弦{f}f = {a}  ({rt:.2f}s)\n")
         else:
-            self.feedback.configure(text=f"MISS 正解={a}  ({rt:.2f}s)")
+            self.feedback_var.set(f"MISS 正解={a}  ({rt:.2f}s)")
             self.log_append(f"MISS: {s}弦{f}f  入力={user or '∅'}  正解={a}  ({rt:.2f}s)\n")
             if not self.review_mode:
                 self.wrong_pool.append((s, f, a))
+                self._wrong_count += 1
 
         self.records.append(QuestionRecord(
             session_id=self.session_id,
@@ -441,21 +555,22 @@ class FretTrainerUI(tk.Tk):
         ))
 
         self._update_stat()
-        self.after(200, self.next_q)
+        self.after(CORRECT_DELAY_MS if is_correct else MISS_DELAY_MS, self.next_q)
 
     def pass_q(self):
         if not self.in_quiz or not self.current:
             return
 
         s, f, a = self.current
-        rt = time.time() - self.q_start
+        rt = _now() - self.q_start
         self.passed += 1
 
-        self.feedback.configure(text=f"PASS 正解={a}  ({rt:.2f}s)")
+        self.feedback_var.set(f"PASS 正解={a}  ({rt:.2f}s)")
         self.log_append(f"PASS: {s}弦{f}f  正解={a}  ({rt:.2f}s)\n")
 
         if not self.review_mode:
             self.wrong_pool.append((s, f, a))
+            self._wrong_count += 1
 
         self.records.append(QuestionRecord(
             session_id=self.session_id,
@@ -470,31 +585,37 @@ class FretTrainerUI(tk.Tk):
         ))
 
         self._update_stat()
-        self.after(200, self.next_q)
+        self.after(MISS_DELAY_MS, self.next_q)
+
+    def _set_stat(self, key: str, var: tk.StringVar, text: str):
+        if self._stat_text.get(key) == text:
+            return
+        var.set(text)
+        self._stat_text[key] = text
 
     def _update_stat(self):
-        elapsed = time.time() - self.session_start if self.session_start else 0.0
-        wrong = len(self.wrong_pool) if not self.review_mode else max(0, self.q_index - self.correct - self.passed)
-        self.progress.configure(text=f"進捗: {self.q_index}/{self.total_q}")
-        self.score.configure(text=f"正解: {self.correct}")
-        self.timer.configure(text=f"経過: {elapsed:.1f}s")
-        # 間違い表示：通常は wrong_pool、復習は概算
+        elapsed = _now() - self.session_start if self.session_start else 0.0
+        self._set_stat("progress", self.progress_var, f"進捗: {self.q_index}/{self.total_q}")
+        self._set_stat("score", self.score_var, f"正解: {self.correct}")
+        self._set_stat("timer", self.timer_var, f"経過: {elapsed:.1f}s")
+        # 間違い表示：通常は間違い数カウンタ、復習は概算
         if not self.review_mode:
-            self.wrong_label.configure(text=f"間違い: {len(self.wrong_pool)}")
+            self._set_stat("wrong", self.wrong_var, f"間違い: {self._wrong_count}")
         else:
-            self.wrong_label.configure(text=f"間違い: {max(0, self.q_index - self.correct)}")
+            self._set_stat("wrong", self.wrong_var, f"間違い: {max(0, self.q_index - self.correct)}")
 
     def _tick(self):
         if not self.in_quiz:
             return
         # 制限超過の表示をしない（ログ・採点・保存はそのまま）
+        # 経過秒は毎回変わるので毎 tick 作り直す（変わっていないラベルは _set_stat が configure しない）
         self._update_stat()
-        self.after(100, self._tick)
+        self.after(250, self._tick)
 
     # -------- saving & best --------
     def finish_and_save(self):
         self.in_quiz = False
-        elapsed = time.time() - self.session_start
+        elapsed = _now() - self.session_start
         avg = elapsed / max(1, self.total_q)
         wrong = self.total_q - self.correct - self.passed
         acc = self.correct / max(1, self.total_q)
@@ -520,21 +641,6 @@ class FretTrainerUI(tk.Tk):
             grade=g
         )
 
-        # 保存（完走したときだけ）
-        ensure_log_dir()
-
-        # 1問ログ
-        q_fields = list(asdict(self.records[0]).keys()) if self.records else [
-            "session_id","q_index","string","fret","correct_note","user_input",
-            "is_correct","is_pass","response_time_sec"
-        ]
-        for r in self.records:
-            append_csv(QUESTIONS_CSV, q_fields, asdict(r))
-
-        # 要約ログ
-        s_fields = list(asdict(summary).keys())
-        append_csv(SUMMARY_CSV, s_fields, asdict(summary))
-
         # ベスト判定（通常/復習どちらも記録する。嫌なら通常だけに変更可）
         candidate_best = {
             "session_id": summary.session_id,
@@ -548,12 +654,19 @@ class FretTrainerUI(tk.Tk):
             "fret_max": summary.fret_max,
             "enabled_strings": summary.enabled_strings,
         }
-        best = read_best()
-        if is_new_best(candidate_best, best):
-            write_best(candidate_best)
-            best = candidate_best
+        new_best = is_new_best(candidate_best, self._get_best())
+        if new_best:
+            self._best_cache = candidate_best
             self.log_append("\n★ ベスト更新！\n")
-        self._show_best_on_start()  # 表示更新
+            self._show_best_on_start()  # 表示更新（ベストが変わったときだけ）
+
+        # 保存（完走したときだけ）。ファイル書き込みはバックグラウンドで行う
+        fut = self._io_pool.submit(
+            self._persist_session, list(self.records), summary, candidate_best if new_best else None
+        )
+        self._io_pending += 1
+        # 完了通知は I/O スレッドで呼ばれるので、処理は after で Tk スレッドへ渡す
+        fut.add_done_callback(lambda f: self.after(0, self._on_persisted, f))
 
         # UI表示
         self.log_append("\n=== 完走：保存しました ===\n")
@@ -564,10 +677,34 @@ class FretTrainerUI(tk.Tk):
             f"平均 {avg:.2f}s/問  合計 {elapsed:.2f}s  Grade {g}\n"
         )
 
-        self.q_label.configure(text=f"完走！ 正解 {self.correct}/{self.total_q}（平均 {avg:.2f}s/問）")
-        self.feedback.configure(text=f"保存: {LOG_DIR}/  | ベストは上部に表示")
+        self.q_var.set(f"完走！ 正解 {self.correct}/{self.total_q}（平均 {avg:.2f}s/問）")
+        self.feedback_var.set(f"保存: {LOG_DIR}/  | ベストは上部に表示")
         self._set_idle()
 
+    def _on_persisted(self, fut):
+        self._io_pending -= 1
+        err = fut.exception()
+        if err is None:
+            return
+        self.log_append(f"\n!!! 保存に失敗しました: {err}\n")
+        self.feedback_var.set(f"保存に失敗しました: {err}")
+        # best.json も書けていないかもしれないので、表示中のベストはファイルから読み直す
+        self._best_cache = _UNSET
+        self._show_best_on_start()
+
+    def _persist_session(self, records: list[QuestionRecord], summary: SessionSummary, new_best: dict | None):
+        # I/Oスレッドで実行（Tkウィジェットには触らない）
+        ensure_log_dir()
+
+        # 1問ログ
+        append_csv_rows(QUESTIONS_CSV, _QR_FIELDS, [_to_row(r, _QR_FIELDS) for r in records])
+
+        # 要約ログ
+        append_csv(SUMMARY_CSV, _SS_FIELDS, _to_row(summary, _SS_FIELDS))
+
+        if new_best is not None:
+            write_best(new_best)
+
 if __name__ == "__main__":
     app = FretTrainerUI()
     app.mainloop()
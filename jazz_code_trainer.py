@@ -19,24 +19,29 @@ Jazz Code Trainer (5弦/6弦ルート)
     code_trainer_logs/best.json（ベスト：正解数→平均秒/問→合計秒で更新）
 """
 
-import csv
-import json
 import os
 import random
 import time
 import tkinter as tk
-from dataclasses import asdict, dataclass
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 from datetime import datetime
+from operator import attrgetter
 from tkinter import ttk, messagebox
 
 # ===== 音名・チューニング（#寄せ固定）=====
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
 OPEN_STRINGS = {6: "E", 5: "A"}  # 5弦/6弦のみ使用
+_NOTE_PC = {n: i for i, n in enumerate(NOTE_NAMES)}
 
 # ===== 出題条件（固定：1〜12フレット）=====
 FRET_MIN = 1
 FRET_MAX = 12
 
+# 回答後、次の問題へ進むまでの待ち（ms）
+FEEDBACK_DELAY_MS = 80
+
 # ===== ログ保存 =====
 LOG_DIR = "code_trainer_logs"
 SUMMARY_CSV = os.path.join(LOG_DIR, "summary.csv")
@@ -49,10 +54,10 @@ def ensure_log_dir():
 
 
 def note_to_pc(note: str) -> int:
-    note = note.strip().upper()
-    if note not in NOTE_NAMES:
+    try:
+        return _NOTE_PC[note.strip().upper()]
+    except KeyError:
         raise ValueError(note)
-    return NOTE_NAMES.index(note)
 
 
 def pc_to_note(pc: int) -> str:
@@ -64,26 +69,32 @@ def calc_root_note(string_no: int, fret: int) -> str:
     return pc_to_note(base + fret)
 
 
+# 半角/全角スペースは除去、♯ は # に寄せる
+_NORM_TRANS = str.maketrans({" ": "", "　": "", "♯": "#"})
+
+
 def normalize_answer(s: str) -> str:
     # 大文字/小文字、空白、全角シャープを吸収
-    s = (s or "").strip().upper().replace(" ", "").replace("　", "").replace("♯", "#")
-    return s
+    return (s or "").strip().upper().translate(_NORM_TRANS)
+
+
+# 正解率の下限（以上でそのグレード）: 0.6→B, 0.75→A, 0.9→S
+_GRADE_THRESHOLDS = (0.6, 0.75, 0.9)
+_GRADE_LABELS = ("C", "B", "A", "S")
 
 
 def grade(correct: int, total: int) -> str:
     if total <= 0:
         return "-"
-    r = correct / total
-    if r >= 0.9:
-        return "S"
-    if r >= 0.75:
-        return "A"
-    if r >= 0.6:
-        return "B"
-    return "C"
+    return _GRADE_LABELS[bisect_right(_GRADE_THRESHOLDS, correct / total)]
+
+
+_UNSET = object()  # ベストキャッシュ未ロードの印
 
 
 def read_best():
+    import json  # 保存まわりでしか使わないので遅延 import
+
     try:
         with open(BEST_JSON, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -94,19 +105,43 @@ def read_best():
 
 
 def write_best(best_obj: dict):
+    import json
+
     ensure_log_dir()
     with open(BEST_JSON, "w", encoding="utf-8") as f:
         json.dump(best_obj, f, ensure_ascii=False, indent=2)
 
 
-def append_csv(path: str, fieldnames: list[str], row: dict):
-    ensure_log_dir()
-    file_exists = os.path.exists(path)
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        if not file_exists:
-            w.writeheader()
-        w.writerow(row)
+class CsvAppender:
+    """
+    追記専用のCSV。初回書き込みで開いたファイルハンドル/writer をアプリ終了まで使い回す。
+    （書き込みは I/O スレッドからのみ行う）
+    """
+
+    def __init__(self, path: str, fieldnames: tuple[str, ...]):
+        self.path = path
+        self.fieldnames = fieldnames
+        self._fh = None
+        self._writer = None
+
+    def write_rows(self, rows: list[tuple]):
+        if self._fh is None:
+            import csv  # 初回書き込み時だけ
+
+            ensure_log_dir()
+            need_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._fh = open(self.path, "a", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._fh)
+            if need_header:
+                self._writer.writerow(self.fieldnames)
+        self._writer.writerows(rows)
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+            self._writer = None
 
 
 def is_new_best(candidate: dict, best: dict | None) -> bool:
@@ -144,48 +179,83 @@ QUALITY_LABEL = {
 }
 
 
+# (chord_type, degree) → 問うべき品質
+_QUALITY_OF = {
+    ("maj7", 3): "M3", ("maj7", 5): "P5", ("maj7", 7): "M7",
+    ("7", 3): "M3", ("7", 5): "P5", ("7", 7): "m7",
+    ("m7", 3): "m3", ("m7", 5): "P5", ("m7", 7): "m7",
+    ("m7b5", 3): "m3", ("m7b5", 5): "b5", ("m7b5", 7): "m7",
+}
+
+
 def chord_tone_quality(chord_type: str, degree: int) -> str:
     """
     chord_type と degree(3/5/7) から、問うべき品質（M3/m3/P5/b5/M7/m7）を返す。
     """
-    if degree == 3:
-        return "M3" if chord_type in ("maj7", "7") else "m3"
-    if degree == 5:
-        return "b5" if chord_type == "m7b5" else "P5"
-    if degree == 7:
-        return "M7" if chord_type == "maj7" else "m7"
-    raise ValueError(degree)
+    try:
+        return _QUALITY_OF[(chord_type, degree)]
+    except KeyError:
+        raise ValueError(degree)
+
+
+# 出題度数の重み（通常：3rd 50%, 7th 25%, 5th 25% / m7b5：均等）
+DEGREE_WEIGHTS = {ct: {3: 0.5, 5: 0.25, 7: 0.25} for ct in CHORD_TYPES}
+DEGREE_WEIGHTS["m7b5"] = {3: 1 / 3, 5: 1 / 3, 7: 1 / 3}
+
+
+def degree_weight(chord_type: str, degree: int) -> float:
+    """chord_type の問題で degree を問う重み（DEGREE_WEIGHTS を引くだけ）"""
+    return DEGREE_WEIGHTS[chord_type][degree]
+
+
+_CHORD_SUFFIX = {"7": "7", "maj7": "maj7", "m7": "m7", "m7b5": "m7b5"}
+
+
+def make_chord_name(root_note: str, chord_type: str) -> str:
+    return root_note + _CHORD_SUFFIX.get(chord_type, chord_type)
 
 
-def pick_degree(chord_type: str) -> int:
+def _build_answer_table() -> dict:
     """
-    出題度数を重み付けで選ぶ。
-    - 通常：3rd 50%, 7th 25%, 5th 25%
-    - m7b5：均等
+    (root_string, root_fret, chord_type, degree) → (root_note, chord_name, asked_quality, correct_note)
+    出題範囲は 2弦 × 12フレット × 4コード × 3度数 = 288 通りなので起動時に全部作っておく。
     """
-    if chord_type == "m7b5":
-        return random.choice([3, 5, 7])
-    # 3:0.5, 7:0.25, 5:0.25
-    x = random.random()
-    if x < 0.5:
-        return 3
-    if x < 0.75:
-        return 7
-    return 5
+    table = {}
+    for string_no in OPEN_STRINGS:
+        for fret in range(FRET_MIN, FRET_MAX + 1):
+            root_note = calc_root_note(string_no, fret)
+            for chord_type in CHORD_TYPES:
+                chord_name = make_chord_name(root_note, chord_type)
+                for degree in (3, 5, 7):
+                    quality = chord_tone_quality(chord_type, degree)
+                    correct_note = pc_to_note(note_to_pc(root_note) + INTERVALS[quality])
+                    table[(string_no, fret, chord_type, degree)] = (root_note, chord_name, quality, correct_note)
+    return table
 
 
-def make_chord_name(root_note: str, chord_type: str) -> str:
-    if chord_type == "7":
-        return f"{root_note}7"
-    if chord_type == "maj7":
-        return f"{root_note}maj7"
-    if chord_type == "m7":
-        return f"{root_note}m7"
-    if chord_type == "m7b5":
-        return f"{root_note}m7b5"
-    return f"{root_note}{chord_type}"
+ANSWER_TABLE = _build_answer_table()
+
+# 出題候補の全体 (root_string, root_fret, chord_type, degree) と、その出題重み
+UNIVERSE = tuple(ANSWER_TABLE)
+_UNIVERSE_WEIGHTS = tuple(degree_weight(ct, d) for (_, _, ct, d) in UNIVERSE)
+
+
+def sample_questions(strings, k: int) -> list[tuple]:
+    """
+    有効なルート弦の出題候補から k 問を選ぶ。
+    - 度数の重みは DEGREE_WEIGHTS（コード種類は均等）
+    - 候補数以内なら重複なし、超える場合は重複ありで選ぶ
+    """
+    pool = [(q, w) for q, w in zip(UNIVERSE, _UNIVERSE_WEIGHTS) if q[0] in strings]
+    if k > len(pool):
+        qs, ws = zip(*pool)
+        return random.choices(qs, weights=ws, k=k)
+    # 重み付き非復元抽出：u^(1/w) の大きい順に k 個
+    keyed = sorted(pool, key=lambda p: random.random() ** (1.0 / p[1]), reverse=True)
+    return [q for q, _ in keyed[:k]]
 
 
+# 1問ログの列定義（records には dataclass ではなく、この並びの tuple を直接積む）
 @dataclass
 class QuestionRecord:
     session_id: str
@@ -202,6 +272,9 @@ class QuestionRecord:
     response_time_sec: float
 
 
+Q_FIELDS = tuple(f.name for f in fields(QuestionRecord))
+
+
 @dataclass
 class SessionSummary:
     session_id: str
@@ -218,6 +291,11 @@ class SessionSummary:
     grade: str
 
 
+S_FIELDS = tuple(f.name for f in fields(SessionSummary))
+# S_FIELDS の並びで値を tuple にする（astuple と違って深いコピーをしない）
+_summary_values = attrgetter(*S_FIELDS)
+
+
 class CodeTrainerUI(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -234,15 +312,31 @@ class CodeTrainerUI(tk.Tk):
 
         self.q_index = 0
         self.correct = 0
-        self.wrong_pool = []  # list[tuple] for review: (root_string, root_fret, chord_type, degree)
+        # for review: (root_string, root_fret, chord_type, degree)。同じ問題は1つにまとめる
+        self.wrong_pool: set[tuple] = set()
+        self._wrong_count = 0  # 通常モードの間違い数（重複も数える）
         self.review_queue = []
-        self.records: list[QuestionRecord] = []
+        self._session_queue: list[tuple] = []  # 今セッションの出題順
+        self._make_question = None
+        self.records: list[tuple] = []  # Q_FIELDS の並び
 
         self.session_id = None
         self.session_start = 0.0
         self.q_start = 0.0
         self.current = None  # dict of current question
 
+        # best.json の内容（このプロセスだけが書くので、書いたときに差し替える）
+        self._best_cache = _UNSET
+        # ステータス表示中の文字列（変化がなければ configure しない）
+        self._last_text = {"progress": "", "score": "", "timer": "", "wrong": ""}
+
+        # ディスク書き込み用（UIスレッドを止めない。1本なので追記順は保たれる）
+        self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="code-io")
+        self._io_pending = 0  # 完了通知をまだ処理していない保存の数
+        self._closing = False
+        self._q_csv = CsvAppender(QUESTIONS_CSV, Q_FIELDS)
+        self._s_csv = CsvAppender(SUMMARY_CSV, S_FIELDS)
+
         self._build_ui()
         self._set_idle()
         self._show_best_on_start()
@@ -335,6 +429,26 @@ class CodeTrainerUI(tk.Tk):
         self.log.configure(state="disabled")
 
         self.bind("<Escape>", lambda e: self.stop())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        if self._closing:
+            return  # 閉じる途中にもう一度 × が押された（待ち合わせ中の update から再入する）
+        self._closing = True
+        # 書き込みを待つ間の入力（Enter で回答など）は無視する：先に隠し、出題中なら中断扱いにする
+        # （submit/pass/stop は in_quiz を、start は _closing を見て何もしない）
+        self.withdraw()
+        self.in_quiz = False
+        # 書き込み待ちの保存を終えてから閉じる。
+        # 完了通知は I/O スレッドから after で届くので、Tk のイベントを回しながら待つ
+        # （ここで shutdown(wait=True) だけをすると、after を待つ I/O スレッドと互いに待ち合う）
+        while self._io_pending:
+            self.update()
+            time.sleep(0.01)
+        self._io_executor.shutdown(wait=True)
+        self._q_csv.close()
+        self._s_csv.close()
+        self.destroy()
 
     def log_append(self, s: str):
         self.log.configure(state="normal")
@@ -349,6 +463,7 @@ class CodeTrainerUI(tk.Tk):
         self.progress.configure(text="進捗: -")
         self.score.configure(text="正解: -")
         self.timer.configure(text="経過: -")
+        self._last_text.update(progress="進捗: -", score="正解: -", timer="経過: -", wrong="間違い: -")
         self.wrong_label.configure(text="間違い: -")
         self.ans_var.set("")
         self.ans_entry.configure(state="disabled")
@@ -379,8 +494,13 @@ class CodeTrainerUI(tk.Tk):
         return enabled, total, mode_text
 
     # -------- best display --------
+    def _get_best(self):
+        if self._best_cache is _UNSET:
+            self._best_cache = read_best()
+        return self._best_cache
+
     def _show_best_on_start(self):
-        best = read_best()
+        best = self._get_best()
         if not best:
             self.best_label.configure(text="ベスト: （まだ記録がありません）")
             return
@@ -395,7 +515,7 @@ class CodeTrainerUI(tk.Tk):
 
     # -------- session control --------
     def start(self):
-        if self.in_quiz:
+        if self.in_quiz or self._closing:
             return
 
         try:
@@ -409,7 +529,7 @@ class CodeTrainerUI(tk.Tk):
                 messagebox.showinfo("復習", "間違いがまだありません。まず通常で解いてください。")
                 return
             self.review_mode = True
-            self.review_queue = self.wrong_pool[:]
+            self.review_queue = list(self.wrong_pool)
             random.shuffle(self.review_queue)
             self.total_q = len(self.review_queue)
             self.enabled_strings = enabled
@@ -419,9 +539,16 @@ class CodeTrainerUI(tk.Tk):
             self.enabled_strings = enabled
             self.total_q = total
             self.mode = "通常"
-            self.wrong_pool = []
+            self.wrong_pool = set()
+
+        if self.review_mode:
+            self._session_queue = self.review_queue
+        else:
+            self._session_queue = sample_questions(self.enabled_strings, self.total_q)
+        self._make_question = self._bind_question_source(self._session_queue)
 
         self.q_index = 0
+        self._wrong_count = 0
         self.correct = 0
         self.records = []
 
@@ -441,19 +568,25 @@ class CodeTrainerUI(tk.Tk):
         self._set_idle()
 
     # -------- quiz engine --------
-    def _generate_question(self):
-        if self.review_mode:
-            root_string, root_fret, chord_type, degree = self.review_queue[self.q_index - 1]
-        else:
-            root_string = random.choice(self.enabled_strings)
-            root_fret = random.randint(FRET_MIN, FRET_MAX)
-            chord_type = random.choice(CHORD_TYPES)
-            degree = pick_degree(chord_type)
+    @staticmethod
+    def _bind_question_source(queue: list[tuple]):
+        """
+        セッション用の出題関数を作る。出題リストと ANSWER_TABLE をクロージャのローカルに束ね、
+        1問ごとの属性/グローバル参照を省く。
+        """
+        table = ANSWER_TABLE
 
-        root_note = calc_root_note(root_string, root_fret)
-        chord_name = make_chord_name(root_note, chord_type)
-        asked_quality = chord_tone_quality(chord_type, degree)
-        correct_note = pc_to_note(note_to_pc(root_note) + INTERVALS[asked_quality])
+        def make_question(i: int) -> tuple:
+            key = queue[i]
+            return key + table[key]
+
+        return make_question
+
+    def _generate_question(self):
+        (
+            root_string, root_fret, chord_type, degree,
+            root_note, chord_name, asked_quality, correct_note,
+        ) = self._make_question(self.q_index - 1)
 
         return {
             "root_string": root_string,
@@ -485,7 +618,7 @@ class CodeTrainerUI(tk.Tk):
         self.q_label.configure(text=q_text)
         self.feedback.configure(text="")
         self.ans_var.set("")
-        self._update_stat()
+        self._update_stat_counters()
 
     def submit(self):
         if not self.in_quiz or not self.current:
@@ -501,55 +634,66 @@ class CodeTrainerUI(tk.Tk):
         if is_correct:
             self.correct += 1
             self.feedback.configure(text=f"OK  ({rt:.2f}s)")
+            self.feedback.update_idletasks()
             self.log_append(
                 f"OK  : {q['root_string']}弦 {q['chord_name']} / {QUALITY_LABEL[q['asked_quality']]} = "
                 f"{q['correct_note']}  ({rt:.2f}s)\n"
             )
         else:
             self.feedback.configure(text=f"MISS 正解={q['correct_note']}  ({rt:.2f}s)")
+            self.feedback.update_idletasks()
             self.log_append(
                 f"MISS: {q['root_string']}弦 {q['chord_name']} / {QUALITY_LABEL[q['asked_quality']]}  "
                 f"入力={user or '∅'}  正解={q['correct_note']}  ({rt:.2f}s)\n"
             )
             if not self.review_mode:
-                self.wrong_pool.append((q["root_string"], q["root_fret"], q["chord_type"], q["asked_degree"]))
-
-        self.records.append(QuestionRecord(
-            session_id=self.session_id,
-            q_index=self.q_index,
-            root_string=q["root_string"],
-            root_fret=q["root_fret"],
-            chord_name=q["chord_name"],
-            chord_type=q["chord_type"],
-            asked_degree=q["asked_degree"],
-            asked_quality=q["asked_quality"],
-            correct_note=q["correct_note"],
-            user_input=user,
-            is_correct=is_correct,
-            response_time_sec=rt
+                self.wrong_pool.add((q["root_string"], q["root_fret"], q["chord_type"], q["asked_degree"]))
+                self._wrong_count += 1
+
+        self.records.append((
+            self.session_id,
+            self.q_index,
+            q["root_string"],
+            q["root_fret"],
+            q["chord_name"],
+            q["chord_type"],
+            q["asked_degree"],
+            q["asked_quality"],
+            q["correct_note"],
+            user,
+            is_correct,
+            rt,
         ))
 
-        self._update_stat()
-        self.after(200, self.next_q)
+        self._update_stat_counters()
+        self.after(FEEDBACK_DELAY_MS, self.next_q)
 
-    def _update_stat(self):
-        elapsed = time.time() - self.session_start if self.session_start else 0.0
-        wrong = (self.q_index - self.correct) if self.in_quiz else (self.total_q - self.correct)
+    def _update_stat_counters(self):
+        # 進捗/正解/間違いは回答・出題時にしか変わらない
         if not self.review_mode:
-            wrong = len(self.wrong_pool)
+            wrong = self._wrong_count
         else:
             wrong = max(0, self.q_index - self.correct)
 
-        self.progress.configure(text=f"進捗: {self.q_index}/{self.total_q}")
-        self.score.configure(text=f"正解: {self.correct}")
-        self.timer.configure(text=f"経過: {elapsed:.1f}s")
-        self.wrong_label.configure(text=f"間違い: {wrong}")
+        self._set_label("progress", self.progress, f"進捗: {self.q_index}/{self.total_q}")
+        self._set_label("score", self.score, f"正解: {self.correct}")
+        self._set_label("wrong", self.wrong_label, f"間違い: {wrong}")
+
+    def _update_timer(self):
+        elapsed = time.time() - self.session_start if self.session_start else 0.0
+        self._set_label("timer", self.timer, f"経過: {elapsed:.1f}s")
+
+    def _set_label(self, key: str, label: ttk.Label, text: str):
+        if self._last_text[key] == text:
+            return
+        label.configure(text=text)
+        self._last_text[key] = text
 
     def _tick(self):
         if not self.in_quiz:
             return
-        self._update_stat()
-        self.after(200, self._tick)
+        self._update_timer()
+        self.after(1000, self._tick)
 
     # -------- saving & best --------
     def finish_and_save(self):
@@ -577,20 +721,6 @@ class CodeTrainerUI(tk.Tk):
             grade=g
         )
 
-        ensure_log_dir()
-
-        # 1問ログ
-        q_fields = list(asdict(self.records[0]).keys()) if self.records else [
-            "session_id", "q_index", "root_string", "root_fret", "chord_name", "chord_type",
-            "asked_degree", "asked_quality", "correct_note", "user_input", "is_correct", "response_time_sec"
-        ]
-        for r in self.records:
-            append_csv(QUESTIONS_CSV, q_fields, asdict(r))
-
-        # 要約ログ
-        s_fields = list(asdict(summary).keys())
-        append_csv(SUMMARY_CSV, s_fields, asdict(summary))
-
         # ベスト判定
         candidate_best = {
             "session_id": summary.session_id,
@@ -603,15 +733,25 @@ class CodeTrainerUI(tk.Tk):
             "avg_sec_per_q": summary.avg_sec_per_q,
             "enabled_strings": summary.enabled_strings,
         }
-        best = read_best()
-        if is_new_best(candidate_best, best):
-            write_best(candidate_best)
-            self.log_append("\n★ ベスト更新！\n")
+        new_best = is_new_best(candidate_best, self._get_best())
+        if new_best:
+            self._best_cache = candidate_best
+
+        # ファイル書き込みはバックグラウンドで行う
+        fut = self._io_executor.submit(
+            self._persist_session, list(self.records), summary, candidate_best if new_best else None
+        )
+        self._io_pending += 1
+        # 完了通知は I/O スレッドで呼ばれるので、処理は after で Tk スレッドへ渡す
+        fut.add_done_callback(lambda f: self.after(0, self._on_persisted, f))
+
         self._show_best_on_start()
 
-        self.log_append("\n=== 完走：保存しました ===\n")
-        self.log_append(f"summary.csv / questions.csv に追記（{LOG_DIR}/）\n")
+        # ログはまとめて1回で追記する
         self.log_append(
+            ("\n★ ベスト更新！\n" if new_best else "")
+            + "\n=== 完走：保存しました ===\n"
+            f"summary.csv / questions.csv に追記（{LOG_DIR}/）\n"
             f"正解 {self.correct}/{self.total_q}  "
             f"平均 {avg:.2f}s/問  合計 {elapsed:.2f}s  Grade {g}\n"
         )
@@ -620,6 +760,30 @@ class CodeTrainerUI(tk.Tk):
         self.feedback.configure(text=f"保存: {LOG_DIR}/  | ベストは上部に表示")
         self._set_idle()
 
+    def _on_persisted(self, fut):
+        self._io_pending -= 1
+        err = fut.exception()
+        if err is None:
+            return
+        self.log_append(f"\n!!! 保存に失敗しました: {err}\n")
+        self.feedback.configure(text=f"保存に失敗しました: {err}")
+        # best.json も書けていないかもしれないので、表示中のベストはファイルから読み直す
+        self._best_cache = _UNSET
+        self._show_best_on_start()
+
+    def _persist_session(self, records: list[tuple], summary: SessionSummary, new_best: dict | None):
+        # I/Oスレッドで実行（Tkウィジェットには触らない）
+        ensure_log_dir()
+
+        # 1問ログ
+        self._q_csv.write_rows(records)
+
+        # 要約ログ
+        self._s_csv.write_rows([_summary_values(summary)])
+
+        if new_best is not None:
+            write_best(new_best)
+
 
 if __name__ == "__main__":
     app = CodeTrainerUI()
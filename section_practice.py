@@ -8,7 +8,7 @@
 - 曲登録時に拍子（例: 4/4）も保存
 - BPM入力時に「試聴メトロノーム（ビープ）」でテンポ確認できる
 - 練習中は常にそのテンポ音（メトロノーム）が鳴る
-- Windows: winsound.Beep を使用
+- Windows: 1小節ぶんのWAVを事前生成し winsound.PlaySound でループ再生
 - macOS: 周波数指定の短いWAVを自動生成して afplay で再生（Windowsと同じ「1拍目アクセント高音」挙動）
 - Linux: paplay / aplay があれば同様に再生（なければベルにフォールバック）
 
@@ -22,6 +22,8 @@
 - practice_logs/sessions.csv
   session_id, timestamp_start, timestamp_end, duration_sec, song_index, song_name,
   bar_start, bar_end, bpm, reps, success, note
+- practice_logs/sessions.csv.pkl
+  sessions.csv のパース結果キャッシュ（消しても次回起動時に作り直される）
 
 互換:
 - 既存 songs.csv が旧形式でも、起動時に列を補完（無い行は 4/4 扱い）
@@ -30,18 +32,23 @@
 import csv
 import math
 import os
+import pickle
 import platform
 import shutil
-import struct
 import subprocess
+import sys
 import tempfile
 import threading
 import time
 import tkinter as tk
 import wave
-from dataclasses import dataclass, asdict
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from operator import attrgetter
 from datetime import datetime
-from tkinter import ttk, messagebox
+from tkinter import ttk
 
 # -----------------------------
 # Config
@@ -49,6 +56,7 @@ from tkinter import ttk, messagebox
 LOG_DIR = "practice_logs"
 SONGS_CSV = os.path.join(LOG_DIR, "songs.csv")
 SESSIONS_CSV = os.path.join(LOG_DIR, "sessions.csv")
+SESSIONS_CACHE = SESSIONS_CSV + ".pkl"  # パース済み sessions のキャッシュ（CSVが変われば作り直す）
 
 SUCCESS_THRESHOLD = 0.90
 
@@ -68,6 +76,9 @@ SESSIONS_FIELDS = [
     "note",
 ]
 
+# 保存ログの末尾（保存先は固定なので起動時に1回だけ組み立てる）
+_LOG_SAVED_TO = f"-> {SESSIONS_CSV}\n"
+
 OS_NAME = platform.system()
 IS_WINDOWS = (OS_NAME == "Windows")
 IS_MAC = (OS_NAME == "Darwin")
@@ -76,16 +87,38 @@ IS_MAC = (OS_NAME == "Darwin")
 # -----------------------------
 # Utilities
 # -----------------------------
+_log_dir_ensured = False
+
+
 def ensure_log_dir():
+    # 一度作成/確認したら、以降は stat しない
+    global _log_dir_ensured
+    if _log_dir_ensured:
+        return
     os.makedirs(LOG_DIR, exist_ok=True)
+    _log_dir_ensured = True
 
 
 def now_iso():
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    n = datetime.now()
+    return f"{n.year:04d}-{n.month:02d}-{n.day:02d} {n.hour:02d}:{n.minute:02d}:{n.second:02d}"
 
 
 def new_session_id():
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
+    n = datetime.now()
+    return f"{n.year:04d}{n.month:02d}{n.day:02d}_{n.hour:02d}{n.minute:02d}{n.second:02d}"
+
+
+def show_error(title: str, msg: str):
+    from tkinter import messagebox  # ダイアログを出す時だけ読み込む
+
+    messagebox.showerror(title, msg)
+
+
+def show_info(title: str, msg: str):
+    from tkinter import messagebox
+
+    messagebox.showinfo(title, msg)
 
 
 def safe_float(x, default=0.0) -> float:
@@ -102,49 +135,161 @@ def safe_int(x, default=0) -> int:
         return default
 
 
-def overlap(a1: int, a2: int, b1: int, b2: int) -> bool:
-    return max(a1, b1) <= min(a2, b2)
+_ts_cache: dict[str, datetime | None] = {}
 
 
 def parse_timestamp(ts: str) -> datetime | None:
     ts = (ts or "").strip()
     if not ts:
         return None
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
+    if ts in _ts_cache:
+        return _ts_cache[ts]
+
+    out = None
+    # 高速パス: "YYYY-MM-DD HH:MM:SS" / "YYYY/MM/DD HH:MM:SS" は strptime を使わず切り出す
+    if (
+        len(ts) == 19 and ts[4] == ts[7] and ts[4] in "-/"
+        and ts[10] == " " and ts[13] == ":" and ts[16] == ":"
+        and (ts[:4] + ts[5:7] + ts[8:10] + ts[11:13] + ts[14:16] + ts[17:]).isdigit()
+    ):
         try:
-            return datetime.strptime(ts, fmt)
-        except Exception:
-            pass
-    return None
+            out = datetime(
+                int(ts[:4]), int(ts[5:7]), int(ts[8:10]),
+                int(ts[11:13]), int(ts[14:16]), int(ts[17:]),
+            )
+        except ValueError:
+            out = None
+    else:
+        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
+            try:
+                out = datetime.strptime(ts, fmt)
+                break
+            except Exception:
+                pass
+    _ts_cache[ts] = out
+    return out
+
+
+# path -> ((st_mtime_ns, st_size), rows)。ファイルが変わっていなければ再パースしない
+_csv_cache: dict[str, tuple[tuple[int, int], list[dict]]] = {}
+
+
+def file_key(path: str) -> tuple[int, int] | None:
+    """ファイルが変わったかどうかの判定用キー（無ければ None）"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_pickle_cache(path: str, version, key: tuple[int, int]):
+    """
+    保存時の version（中身の形式）と key（元CSVの mtime/size）が両方一致するときだけ中身を返す。
+    読めない/形式が違うときは None（呼び出し側でCSVから作り直す）
+    """
+    try:
+        with open(path, "rb") as f:
+            saved_version, saved_key, data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if saved_version != version or saved_key != key:
+        return None
+    return data
+
+
+def save_pickle_cache(path: str, version, key: tuple[int, int], data):
+    # 書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump((version, key, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except (OSError, pickle.PicklingError):
+        pass
 
 
 def read_csv_rows(path: str) -> list[dict]:
-    if not os.path.exists(path):
+    """
+    ※ 変更が無ければ前回と同じ list を返す（キャッシュ共有）。
+       呼び出し側は `is` で比較すれば再計算を省ける。
+    """
+    key = file_key(path)
+    if key is None:
+        _csv_cache.pop(path, None)
         return []
+    hit = _csv_cache.get(path)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    rows = list(iter_csv_rows(path))
+    _csv_cache[path] = (key, rows)
+    return rows
+
+
+def iter_csv_rows(path: str):
+    """1行ずつ dict を返す（全件を list にしない。キャッシュも通さない）"""
+    if not os.path.exists(path):
+        return
     with open(path, "r", newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        return list(r)
+        yield from csv.DictReader(f)
 
 
 def write_csv_rows(path: str, fieldnames: list[str], rows: list[dict]):
     ensure_log_dir()
+    _csv_cache.pop(path, None)
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for row in rows:
-            out = {k: row.get(k, "") for k in fieldnames}
-            w.writerow(out)
+        w = csv.writer(f)
+        w.writerow(fieldnames)
+        w.writerows([row.get(k, "") for k in fieldnames] for row in rows)
 
 
-def append_csv(path: str, fieldnames: list[str], row: dict):
-    ensure_log_dir()
-    file_exists = os.path.exists(path)
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        if not file_exists:
-            w.writeheader()
-        out = {k: row.get(k, "") for k in fieldnames}
-        w.writerow(out)
+class CsvAppender:
+    """
+    追記専用のCSV。初回追記で開いたファイルハンドル/writer をアプリ終了まで使い回す。
+    行は fieldnames の順に並べた tuple で渡す。
+    """
+
+    def __init__(self, path: str, fieldnames: list[str], sync_every: int = 0):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.sync_every = sync_every  # N行ごとに fsync（0: しない。OSの書き戻しに任せる）
+        self._unsynced = 0
+        self._fh = None
+        self._writer = None
+
+    def append(self, row: tuple):
+        if self._fh is None:
+            ensure_log_dir()
+            self._fh = open(self.path, "a", newline="", encoding="utf-8", buffering=1 << 16)
+            self._writer = csv.writer(self._fh)
+            # 追記モードは末尾から開くので、位置0なら新規/空ファイル
+            if self._fh.tell() == 0:
+                self._writer.writerow(self.fieldnames)
+        _csv_cache.pop(self.path, None)
+        self._writer.writerow(row)
+        # 異常終了で練習記録を失わないよう、1行ごとに OS へ渡しておく
+        self._fh.flush()
+        if self.sync_every:
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self._sync()
+
+    def _sync(self):
+        # ディスクまで書き切る（毎回だと保存ごとに数ms止まるので sync_every 行ごと）
+        try:
+            os.fsync(self._fh.fileno())
+        except OSError:
+            pass
+        self._unsynced = 0
+
+    def close(self):
+        if self._fh is not None:
+            if self._unsynced:
+                self._fh.flush()
+                self._sync()
+            self._fh.close()
+            self._fh = None
+            self._writer = None
 
 
 def ensure_songs_schema():
@@ -162,20 +307,22 @@ def ensure_songs_schema():
         header = next(r, [])
 
     header_set = set(header)
-    need_rewrite = any(col not in header_set for col in SONGS_FIELDS)
+    if all(col in header_set for col in SONGS_FIELDS):
+        # ヘッダが揃っていれば読み直さない（空欄の拍子は load_songs がメモリ上で補完）
+        return
 
     rows = read_csv_rows(SONGS_CSV)
 
+    ts = now_iso()  # 補完する created_at は全行同じ時刻でよい
     for row in rows:
         if not (row.get("beats_per_bar") or "").strip():
             row["beats_per_bar"] = "4"
         if not (row.get("beat_unit") or "").strip():
             row["beat_unit"] = "4"
         if not (row.get("created_at") or "").strip():
-            row["created_at"] = now_iso()
+            row["created_at"] = ts
 
-    if need_rewrite:
-        write_csv_rows(SONGS_CSV, SONGS_FIELDS, rows)
+    write_csv_rows(SONGS_CSV, SONGS_FIELDS, rows)
 
 
 def ensure_sessions_schema():
@@ -185,6 +332,32 @@ def ensure_sessions_schema():
         write_csv_rows(SESSIONS_CSV, SESSIONS_FIELDS, [])
 
 
+SESSION_COLS = ("song_index", "bar_start", "bar_end", "reps", "success", "bpm", "ts")
+# sessions.csv.pkl の形式。中身 (sessions, 列, 索引) の作りを変えたら番号を上げる
+SESSIONS_CACHE_VERSION = (1, SESSION_COLS)
+
+
+def session_numbers(r: dict) -> tuple:
+    """sessions の1行から、提案計算に使う値を SESSION_COLS の順で取り出す"""
+    idx = safe_int(r.get("song_index"), -1)
+    bs = safe_int(r.get("bar_start"), None)
+    be = safe_int(r.get("bar_end"), None)
+    if bs is None or be is None:
+        # 小節が読めない行はどの曲にも一致させない
+        idx, bs, be = -1, 0, 0
+    elif bs > be:
+        bs, be = be, bs
+    return (
+        idx,
+        bs,
+        be,
+        safe_int(r.get("reps"), 0),
+        safe_int(r.get("success"), 0),
+        safe_int(r.get("bpm"), 0),
+        parse_timestamp(r.get("timestamp_start") or ""),
+    )
+
+
 # -----------------------------
 # Cross-platform tone (no C-extension)
 # -----------------------------
@@ -192,16 +365,18 @@ class TonePlayer:
     """
     OS差を吸収して周波数指定のビープを鳴らす（Segfault回避のためネイティブ拡張は使用しない）。
 
-    - Windows: winsound.Beep(freq, ms)
+    - Windows: 1小節ぶんの事前生成WAVを PlaySound(SND_ASYNC | SND_LOOP) でループ再生
+               （小節WAVを作れない/鳴らせないときは beep() の winsound.Beep(freq, ms) にフォールバック）
     - macOS:   事前生成したWAVを afplay で再生（周波数/長さを一致させる）
     - Linux:   paplay / aplay があれば再生、無ければベル '\a' にフォールバック
 
-    ※ 再生は「ブロッキング」（winsound.Beepに近い）にしてテンポを安定させる
+    ※ beep() は「ブロッキング」にしてテンポを安定させる（メトロノームのスレッドから1拍ずつ呼ぶ）
     """
 
     def __init__(self, sample_rate: int = 44100):
         self.sample_rate = sample_rate
         self._cache: dict[tuple[int, int], str] = {}
+        self._bar_cache: dict[tuple[int, int, int, int, int], str] = {}
         self._lock = threading.Lock()
         self._tmp_files: set[str] = set()
 
@@ -224,6 +399,7 @@ class TonePlayer:
             files = list(self._tmp_files)
             self._tmp_files.clear()
             self._cache.clear()
+            self._bar_cache.clear()
         for p in files:
             try:
                 if os.path.exists(p):
@@ -240,9 +416,37 @@ class TonePlayer:
 
         # WAV生成（16-bit PCM mono）
         n_samples = max(1, int(self.sample_rate * (ms / 1000.0)))
+        path = self._write_wav(f"metro_{freq}_{ms}_", self._tone_frames(freq, n_samples))
+
+        with self._lock:
+            self._cache[key] = path
+            self._tmp_files.add(path)
+        return path
+
+    def _tone_frames(self, freq: int, n_samples: int) -> bytes:
         amplitude = 0.25  # 0.0〜1.0
 
-        fd, path = tempfile.mkstemp(prefix=f"metro_{freq}_{ms}_", suffix=".wav")
+        # ポップノイズ軽減のため、簡単なフェード（2ms程度）
+        fade_ms = 2
+        fade_n = max(1, int(self.sample_rate * (fade_ms / 1000.0)))
+        w = 2.0 * math.pi * float(freq) / self.sample_rate
+        scale = amplitude * 32767.0
+        sin = math.sin
+        vals = [sin(w * i) * scale for i in range(n_samples)]
+
+        # fade in/out（端の fade_n サンプルだけ）
+        for i in range(min(fade_n, n_samples)):
+            g = i / fade_n
+            vals[i] *= g
+            vals[n_samples - 1 - i] *= g
+
+        buf = array("h", map(int, vals))
+        if sys.byteorder == "big":
+            buf.byteswap()  # WAV はリトルエンディアン
+        return buf.tobytes()
+
+    def _write_wav(self, prefix: str, frames: bytes) -> str:
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix=".wav")
         os.close(fd)
 
         try:
@@ -250,22 +454,7 @@ class TonePlayer:
                 wf.setnchannels(1)
                 wf.setsampwidth(2)  # 16-bit
                 wf.setframerate(self.sample_rate)
-
-                # ポップノイズ軽減のため、簡単なフェード（2ms程度）
-                fade_ms = 2
-                fade_n = max(1, int(self.sample_rate * (fade_ms / 1000.0)))
-                for i in range(n_samples):
-                    t = i / self.sample_rate
-                    v = math.sin(2.0 * math.pi * float(freq) * t) * amplitude
-
-                    # fade in/out
-                    if i < fade_n:
-                        v *= (i / fade_n)
-                    if (n_samples - 1 - i) < fade_n:
-                        v *= ((n_samples - 1 - i) / fade_n)
-
-                    s = int(v * 32767.0)
-                    wf.writeframes(struct.pack("<h", s))
+                wf.writeframes(frames)
         except Exception:
             # 生成に失敗したら削除してフォールバックへ
             try:
@@ -274,12 +463,65 @@ class TonePlayer:
             except Exception:
                 pass
             raise
+        return path
+
+    # ---- 1小節ぶんのループ再生（Windows） ----
+    def can_loop(self) -> bool:
+        return self._winsound is not None
 
+    def _bar_wav_path(self, bpm: int, bpb: int, freq_accent: int, freq_normal: int, ms: int) -> str:
+        """1拍目アクセント + 残り(bpb-1)拍 + 無音 を1小節ぶん並べたWAVを作る"""
+        key = (bpm, bpb, freq_accent, freq_normal, ms)
         with self._lock:
-            self._cache[key] = path
+            p = self._bar_cache.get(key)
+            if p and os.path.exists(p):
+                return p
+
+        samples_per_beat = self.samples_per_beat(bpm)
+        n_tone = max(1, min(samples_per_beat, int(self.sample_rate * (ms / 1000.0))))
+        pad = b"\x00\x00" * (samples_per_beat - n_tone)
+        accent = self._tone_frames(freq_accent, n_tone) + pad
+        normal = self._tone_frames(freq_normal, n_tone) + pad
+        path = self._write_wav(f"metro_bar_{bpm}_{bpb}_", accent + normal * (bpb - 1))
+
+        with self._lock:
+            self._bar_cache[key] = path
             self._tmp_files.add(path)
         return path
 
+    def samples_per_beat(self, bpm: int) -> int:
+        return max(1, round(self.sample_rate * 60 / bpm))
+
+    def prepare_bar_loop(self, bpm: int, bpb: int, freq_accent: int, freq_normal: int, ms: int):
+        """差し替え前に小節WAVだけ作っておく（play_bar_loop がキャッシュを使う）"""
+        self._bar_wav_path(bpm, bpb, freq_accent, freq_normal, ms)
+
+    def play_bar_loop(self, bpm: int, bpb: int, freq_accent: int, freq_normal: int, ms: int):
+        # SND_MEMORY は SND_ASYNC と併用できないため、一時WAVをファイル指定でループさせる
+        ws = self._winsound
+        path = self._bar_wav_path(bpm, bpb, freq_accent, freq_normal, ms)
+        ws.PlaySound(path, ws.SND_FILENAME | ws.SND_ASYNC | ws.SND_LOOP | ws.SND_NODEFAULT)
+        self._drop_bars_except(path)
+
+    def _drop_bars_except(self, keep: str):
+        # 差し替え済み/使われなかった小節WAVは消す（テンポを変えるたびに一時ファイルが溜まらないように）
+        with self._lock:
+            old = [k for k, p in self._bar_cache.items() if p != keep]
+            paths = [self._bar_cache.pop(k) for k in old]
+        for p in paths:
+            try:
+                os.remove(p)
+            except OSError:
+                continue  # 消せなければ close() でもう一度消す
+            with self._lock:
+                self._tmp_files.discard(p)
+
+    def stop_loop(self):
+        try:
+            self._winsound.PlaySound(None, 0)
+        except Exception:
+            pass
+
     def _run_cmd_blocking(self, cmd: list[str]):
         # どんな失敗も「鳴らない」だけにする（例外でアプリを落とさない）
         try:
@@ -342,11 +584,19 @@ class TonePlayer:
             pass
 
 
+# ループ再生する1小節の長さの上限（秒）。これより長い小節は WAV が大きくなる
+# （1 BPM × 32拍だと百MB超）ので作らず、スレッド方式で鳴らす
+LOOP_BAR_MAX_SEC = 16
+
+
 class BeepMetronome:
     """
     クロスプラットフォームの簡易メトロノーム。
     - 1拍目（小節頭）は高い音、他は低い音
-    - start/stop でスレッド制御
+    - Windows: 1小節ぶんのPCMを事前生成し、PlaySound の非同期ループで鳴らす（スレッド無し）
+      テンポ変更時は新しい小節を先に作り、鳴っている小節の終わりで差し替える
+      ループを始められなかったときは、下のスレッド方式（winsound.Beep）で鳴らす
+    - その他: start/stop でスレッド制御
     """
 
     def __init__(self):
@@ -361,6 +611,10 @@ class BeepMetronome:
         self.beep_ms = 30
 
         self._player = TonePlayer()
+        self._loop_params = None  # ループ再生中の (bpm, bpb)。停止中は None
+        self._loop_t0_ns = 0  # 現在のループを鳴らし始めた時刻
+        self._loop_bar_ns = 1  # 1小節の長さ
+        self._swap_timer = None
 
     def close(self):
         try:
@@ -373,51 +627,146 @@ class BeepMetronome:
             pass
 
     def update(self, bpm: int, beats_per_bar: int):
+        bpm = max(1, min(400, int(bpm)))
+        beats_per_bar = max(1, min(32, int(beats_per_bar)))
+        if bpm == self.bpm and beats_per_bar == self.beats_per_bar:
+            return  # 変化なし（ロックもループ差し替えも不要）
         with self._lock:
-            self.bpm = max(1, min(400, int(bpm)))
-            self.beats_per_bar = max(1, min(32, int(beats_per_bar)))
+            self.bpm = bpm
+            self.beats_per_bar = beats_per_bar
+            params = (bpm, beats_per_bar)
+            if self._loop_params is None:
+                # スレッド方式で鳴っている間にループで鳴らせる長さへ戻ったら、ループに切り替える
+                if self._thread is not None and self._loop_ok(params) and self._play_loop(params):
+                    self._stop_thread()
+                return
+            if self._loop_params == params:
+                return
+            if not self._loop_ok(params):
+                # BPM入力途中の「1」などで長大な小節を UI スレッドで書かないよう、作らずスレッド方式へ
+                self._loop_params = None
+                self._player.stop_loop()
+                self._start_thread()
+                return
+            self._loop_params = params
+        # ループ再生中にテンポ/拍子が変わったら、次の小節頭で差し替える
+        self._schedule_loop_swap(params)
 
     def is_running(self) -> bool:
+        if self._loop_params is not None:
+            return True
         return self._thread is not None and self._thread.is_alive()
 
     def start(self, bpm: int, beats_per_bar: int):
         self.update(bpm, beats_per_bar)
         if self.is_running():
             return
-        self._stop.clear()
-        self._thread = threading.Thread(target=self._run, daemon=True)
-        self._thread.start()
+        with self._lock:
+            params = (self.bpm, self.beats_per_bar)
+            if self._loop_ok(params) and self._play_loop(params):
+                return
+            self._start_thread()
 
     def stop(self):
+        with self._lock:
+            self._stop_thread()
+            self._loop_params = None
+            # 差し替えに失敗してループ状態を失った後でも鳴り残らないよう、ループ停止は常に呼ぶ
+            if self._player.can_loop():
+                self._player.stop_loop()
+        if self._swap_timer is not None:
+            self._swap_timer.cancel()
+            self._swap_timer = None
+
+    def _loop_ok(self, params: tuple[int, int]) -> bool:
+        bpm, bpb = params
+        return self._player.can_loop() and bpb * 60 <= LOOP_BAR_MAX_SEC * bpm
+
+    def _play_loop(self, params: tuple[int, int]) -> bool:
+        # self._lock を持った状態で呼ぶ
+        bpm, bpb = params
+        try:
+            self._player.play_bar_loop(bpm, bpb, self.freq_accent, self.freq_normal, self.beep_ms)
+        except Exception:
+            # 生成/再生に失敗したらスレッド方式へフォールバック
+            self._loop_params = None
+            return False
+        self._loop_params = params
+        self._loop_t0_ns = time.perf_counter_ns()
+        sr = self._player.sample_rate
+        self._loop_bar_ns = bpb * self._player.samples_per_beat(bpm) * 1_000_000_000 // sr
+        return True
+
+    def _schedule_loop_swap(self, params: tuple[int, int]):
+        # 新しい小節は先に作っておき、鳴っている小節の終わりで PlaySound を差し替える
+        # （その場で鳴らし直すと小節の途中で途切れ、拍がずれる）
+        try:
+            self._player.prepare_bar_loop(*params, self.freq_accent, self.freq_normal, self.beep_ms)
+        except Exception:
+            pass  # 差し替え時にもう一度試す
+        if self._swap_timer is not None:
+            self._swap_timer.cancel()
+        elapsed_ns = time.perf_counter_ns() - self._loop_t0_ns
+        wait_ns = self._loop_bar_ns - elapsed_ns % self._loop_bar_ns
+        self._swap_timer = threading.Timer(wait_ns / 1e9, self._swap_loop, args=(params,))
+        self._swap_timer.daemon = True
+        self._swap_timer.start()
+
+    def _swap_loop(self, params: tuple[int, int]):
+        with self._lock:
+            if self._loop_params != params:
+                return  # 停止済み、または更に別のテンポに変わった
+            if self._play_loop(params):
+                return
+            # 新しい小節を鳴らせなかったら、鳴っている古いループを止めてスレッド方式で続ける（start と同じ）
+            self._player.stop_loop()
+            self._start_thread()
+
+    def _start_thread(self):
+        # self._lock を持った状態で呼ぶ。停止フラグはスレッドごとに作る
+        # （止めたばかりのスレッドが Beep 中でも、新しいスレッドのフラグとは混ざらない）
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+        self._thread.start()
+
+    def _stop_thread(self):
+        # self._lock を持った状態で呼ぶ
         self._stop.set()
+        self._thread = None
 
-    def _run(self):
+    def _run(self, stop: threading.Event):
+        # 時刻は整数 ns で持つ（float の誤差が長時間で積み上がらないように）
         beat = 0
-        next_t = time.perf_counter()
+        next_t_ns = time.perf_counter_ns()
 
-        while not self._stop.is_set():
+        while not stop.is_set():
             with self._lock:
                 bpm = self.bpm
                 bpb = self.beats_per_bar
 
-            interval = 60.0 / max(1, bpm)
-            now = time.perf_counter()
+            interval_ns = 60_000_000_000 // max(1, bpm)
+            delta_ns = next_t_ns - time.perf_counter_ns()
 
-            if now < next_t:
-                time.sleep(min(0.01, next_t - now))
+            if delta_ns > 2_000_000:
+                # 目標の1ms手前まで眠る（stop されたら即起きる）
+                stop.wait((delta_ns - 1_000_000) / 1e9)
                 continue
+            if delta_ns > 0:
+                # 残り2ms以内は spin で詰める
+                while time.perf_counter_ns() < next_t_ns:
+                    pass
 
             freq = self.freq_accent if (beat % bpb == 0) else self.freq_normal
             self._player.beep(freq, self.beep_ms)
 
             beat = (beat + 1) % bpb
-            next_t += interval
+            next_t_ns += interval_ns
 
 
 # -----------------------------
 # Data model
 # -----------------------------
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SessionRow:
     session_id: str
     timestamp_start: str
@@ -433,6 +782,10 @@ class SessionRow:
     note: str
 
 
+# SessionRow -> SESSIONS_FIELDS 順の tuple（asdict のように dict/deepcopy を作らない）
+session_row_values = attrgetter(*SESSIONS_FIELDS)
+
+
 # -----------------------------
 # App
 # -----------------------------
@@ -449,10 +802,19 @@ class PracticeTracker(tk.Tk):
         # songs
         self.songs: list[dict] = []
         self.filtered_song_indices: list[int | None] = []
+        self._listed = None  # 直近に Listbox へ描画した (songs, 検索語)
         self.load_songs()
 
         # sessions cache
         self.sessions: list[dict] = []
+        self._sessions_key = None  # 読み込み済み sessions.csv の file_key
+        self._cache_key = None  # sessions.csv.pkl に書いてある file_key
+        self._sessions_gen = 0  # メモリ上の sessions が変わるたびに +1（提案キャッシュの無効化用）
+        self._session_writes: list = []  # 完了通知をまだ処理していない追記（Future）
+        self._closing = False
+        self._resync_sessions = False  # 追記に失敗した行がメモリにだけある → 書き込み完了後に読み直す
+        self._suggest_key = None  # 直近の提案計算の (song_index, bar_start, bar_end, _sessions_gen)
+        self._suggest_res = None
         self.load_sessions()
 
         # selection state
@@ -460,21 +822,42 @@ class PracticeTracker(tk.Tk):
         self.selected_song_name = None
         self.selected_beats_per_bar = 4
         self.selected_beat_unit = 4
+        self._selected_desc = ""  # "[idx] 曲名 (4/4)"
+        self._last_suggested_bpm = None
 
         # session runtime state
         self.active = False
         self.session_id = None
         self.t_start_iso = None
-        self.t_start_epoch = None
+        self.t_start_mono = None
         self.reps = 0
         self.success = 0
         self.locked_bar_start = None
         self.locked_bar_end = None
         self.locked_bpm = None
 
+        # CSV appenders（開きっぱなしにして使い回す）
+        self._songs_appender = CsvAppender(SONGS_CSV, SONGS_FIELDS)
+        self._sessions_appender = CsvAppender(SESSIONS_CSV, SESSIONS_FIELDS, sync_every=10)
+        # sessions.csv への追記は UIスレッドを止めないよう I/O スレッドで（1本なので追記順は保たれる）
+        self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="practice-io")
+
         # metronome
         self.metro = BeepMetronome()
 
+        # カウンター表示の更新待ち（after_idle 済み）と、表示中の文字列
+        self._labels_dirty = False
+        self._last_text = {"reps": "回数: 0", "success": "成功: 0", "rate": "成功率: -"}
+        self._last_counter_key = None  # 直近に描画を予約した (reps, success)
+
+        # KeyRelease のデバウンス用 after id
+        self._suggest_after_id = None
+        self._preview_after_id = None
+
+        # 状態欄（エラー表示から戻す先の文字列と、その after id）
+        self._status_text = "状態: -"
+        self._status_err_after_id = None
+
         self._build_ui()
         self.refresh_song_list()
         self._set_idle_state()
@@ -485,7 +868,7 @@ class PracticeTracker(tk.Tk):
 
     def _log_audio_backend_info(self):
         if IS_WINDOWS:
-            self.log_append("\n[Audio] Windows: winsound.Beep\n")
+            self.log_append("\n[Audio] Windows: winsound.PlaySound (looped bar WAV)\n")
         elif IS_MAC:
             if shutil.which("afplay"):
                 self.log_append("\n[Audio] macOS: afplay + generated WAV (freq-based)\n")
@@ -592,13 +975,13 @@ class PracticeTracker(tk.Tk):
         self.bar_start_var = tk.StringVar()
         self.bar_start_entry = ttk.Entry(row1, textvariable=self.bar_start_var, width=8)
         self.bar_start_entry.pack(side="left", padx=(6, 12))
-        self.bar_start_entry.bind("<KeyRelease>", lambda e: self._update_suggestion())
+        self.bar_start_entry.bind("<KeyRelease>", lambda e: self._schedule_suggestion())
 
         ttk.Label(row1, text="終了小節").pack(side="left")
         self.bar_end_var = tk.StringVar()
         self.bar_end_entry = ttk.Entry(row1, textvariable=self.bar_end_var, width=8)
         self.bar_end_entry.pack(side="left", padx=(6, 12))
-        self.bar_end_entry.bind("<KeyRelease>", lambda e: self._update_suggestion())
+        self.bar_end_entry.bind("<KeyRelease>", lambda e: self._schedule_suggestion())
 
         ttk.Label(row1, text="備考（任意）").pack(side="left")
         self.note_var = tk.StringVar()
@@ -620,12 +1003,13 @@ class PracticeTracker(tk.Tk):
         self.bpm_var = tk.StringVar()
         self.bpm_entry = ttk.Entry(bpm_row, textvariable=self.bpm_var, width=10)
         self.bpm_entry.pack(side="left", padx=(6, 12))
-        self.bpm_entry.bind("<KeyRelease>", lambda e: self._sync_preview_if_running())
+        self.bpm_entry.bind("<KeyRelease>", lambda e: self._schedule_preview_sync())
 
         self.apply_suggest_btn = ttk.Button(bpm_row, text="提案BPMをセット", command=self.apply_suggested_bpm)
         self.apply_suggest_btn.pack(side="left")
 
         self.preview_btn = ttk.Button(bpm_row, text="試聴 ▶", command=self.toggle_preview_metronome)
+        self._preview_text = "試聴 ▶"
         self.preview_btn.pack(side="left", padx=(10, 0))
 
         self.meter_label = ttk.Label(bpm_row, text="拍子: -", font=("Helvetica", 10, "bold"))
@@ -691,29 +1075,52 @@ class PracticeTracker(tk.Tk):
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def on_close(self):
+        if self._closing:
+            return  # 閉じる途中にもう一度 × が押された（待ち合わせ中の update から再入する）
+        self._closing = True
+        # 書き込みを待つ間に入力から新しい処理が始まらないよう、先に隠しておく
+        self.withdraw()
+        for after_id in (self._suggest_after_id, self._preview_after_id, self._status_err_after_id):
+            if after_id is not None:
+                self.after_cancel(after_id)
         # 終了時に必ず止める
         try:
             self.metro.close()
         except Exception:
             pass
+        # 書き込み待ちの保存を終えてから閉じる。
+        # 完了通知は I/O スレッドから after で届くので、Tk のイベントを回しながら待つ
+        # （ここで shutdown(wait=True) だけをすると、after を待つ I/O スレッドと互いに待ち合う）
+        while self._session_writes:
+            self.update()
+            time.sleep(0.01)
+        self._io_executor.shutdown(wait=True)
+        # 今回追記した分も含めて pkl を作り直しておく（次回起動でCSVを再パースしない）
+        self._save_sessions_cache()
+        self._songs_appender.close()
+        self._sessions_appender.close()
         self.destroy()
 
     def log_append(self, s: str):
+        # 呼び出し側でメッセージを1本にまとめておき、状態の切り替えは追記1回につき1往復だけ
         self.log.configure(state="normal")
         self.log.insert("end", s)
-        self.log.see("end")
         self.log.configure(state="disabled")
+        self.log.see("end")
 
     def show_paths(self):
         ensure_log_dir()
-        messagebox.showinfo(
+        show_info(
             "保存先",
             f"曲インデックス: {SONGS_CSV}\n練習ログ: {SESSIONS_CSV}\n（フォルダ: {os.path.abspath(LOG_DIR)}）"
         )
 
     # ---------- songs ----------
     def load_songs(self):
-        self.songs = read_csv_rows(SONGS_CSV)
+        rows = read_csv_rows(SONGS_CSV)
+        if rows is self.songs:
+            return  # songs.csv に変更なし（補完/ソート/索引は作成済み）
+        self.songs = rows
 
         # 互換補完（メモリ上）
         for r in self.songs:
@@ -722,72 +1129,73 @@ class PracticeTracker(tk.Tk):
             if not (r.get("beat_unit") or "").strip():
                 r["beat_unit"] = "4"
 
-        def keyfun(r):
-            try:
-                return int(r.get("song_index", ""))
-            except Exception:
-                return 10**9
-
-        self.songs.sort(key=keyfun)
+        # インデックス等の int 化は読み込み時に1回だけ行い、行に持たせておく
+        self._song_by_idx: dict[int, dict] = {}
+        self._max_song_idx = 0
+        for r in self.songs:
+            idx = safe_int(r.get("song_index"), None)
+            r["_idx_int"] = idx
+            # 0 や空は 4 扱い（選択後の selected_beats_per_bar は常に正の int）
+            r["_bpb_int"] = safe_int(r.get("beats_per_bar"), 4) or 4
+            r["_bu_int"] = safe_int(r.get("beat_unit"), 4) or 4
+            # リスト表示/検索用の文字列もここで作っておく（検索のたびに組み立てない）
+            idx_s = (r.get("song_index") or "").strip()
+            name = (r.get("song_name") or "").strip()
+            bpb_s = (r.get("beats_per_bar") or "4").strip()
+            bu_s = (r.get("beat_unit") or "4").strip()
+            r["_display"] = f"[{idx_s}] {name} ({bpb_s}/{bu_s})"
+            r["_search_blob"] = f"{idx_s}\n{name}".lower()
+            if idx is not None:
+                self._song_by_idx.setdefault(idx, r)
+                self._max_song_idx = max(self._max_song_idx, idx)
+
+        self.songs.sort(key=lambda r: 10**9 if r["_idx_int"] is None else r["_idx_int"])
 
     def refresh_song_list(self):
         self.load_songs()
         q = self.search_var.get().strip().lower()
 
-        self.song_listbox.delete(0, tk.END)
-        self.filtered_song_indices = []
-
-        for row in self.songs:
-            idx = (row.get("song_index") or "").strip()
-            name = (row.get("song_name") or "").strip()
-            bpb = (row.get("beats_per_bar") or "4").strip()
-            bu = (row.get("beat_unit") or "4").strip()
+        # songs.csv も検索語も前回描画時と同じなら、Tcl に何も送らない（矢印キー等の KeyRelease）
+        listed = self._listed
+        if listed is not None and listed[0] is self.songs and listed[1] == q:
+            return
 
-            if q and (q not in idx.lower()) and (q not in name.lower()):
-                continue
+        if q:
+            rows = [row for row in self.songs if q in row["_search_blob"]]
+        else:
+            rows = self.songs
 
-            self.song_listbox.insert(tk.END, f"[{idx}] {name} ({bpb}/{bu})")
-            try:
-                self.filtered_song_indices.append(int(idx))
-            except Exception:
-                self.filtered_song_indices.append(None)
+        self.song_listbox.delete(0, tk.END)
+        if rows:
+            self.song_listbox.insert(tk.END, *[row["_display"] for row in rows])
+        self.filtered_song_indices = [row["_idx_int"] for row in rows]
+        # 無効状態の Listbox は delete/insert を無視するので、その時は描画済み扱いにしない
+        if str(self.song_listbox.cget("state")) == "normal":
+            self._listed = (self.songs, q)
+        else:
+            self._listed = None
 
     def next_song_index(self) -> int:
-        max_idx = 0
-        for r in self.songs:
-            try:
-                max_idx = max(max_idx, int(r.get("song_index", 0)))
-            except Exception:
-                pass
-        return max_idx + 1
+        return self._max_song_idx + 1
 
     def add_song(self):
         name = self.new_song_name_var.get().strip()
         if not name:
-            messagebox.showerror("入力エラー", "曲名を入力してください。")
+            show_error("入力エラー", "曲名を入力してください。")
             return
 
         bpb = safe_int(self.new_bpb_var.get(), 4)
         bu = safe_int(self.new_bu_var.get(), 4)
         if bpb <= 0 or bpb > 32:
-            messagebox.showerror("入力エラー", "拍子（分子）は 1〜32 で指定してください。")
+            show_error("入力エラー", "拍子（分子）は 1〜32 で指定してください。")
             return
         if bu not in (2, 4, 8):
-            messagebox.showerror("入力エラー", "拍子（分母）は 2/4/8 のいずれかにしてください。")
+            show_error("入力エラー", "拍子（分母）は 2/4/8 のいずれかにしてください。")
             return
 
         idx = self.next_song_index()
-        append_csv(
-            SONGS_CSV,
-            SONGS_FIELDS,
-            {
-                "song_index": idx,
-                "song_name": name,
-                "beats_per_bar": bpb,
-                "beat_unit": bu,
-                "created_at": now_iso(),
-            },
-        )
+        # SONGS_FIELDS の順
+        self._songs_appender.append((idx, name, bpb, bu, now_iso()))
 
         self.new_song_name_var.set("")
         self.refresh_song_list()
@@ -801,33 +1209,28 @@ class PracticeTracker(tk.Tk):
         try:
             idx = int(s)
         except ValueError:
-            messagebox.showerror("入力エラー", "インデックスは整数で。")
+            show_error("入力エラー", "インデックスは整数で。")
             return
         if not self.select_song_by_index(idx):
-            messagebox.showerror("見つかりません", f"インデックス {idx} の曲が songs.csv にありません。")
+            show_error("見つかりません", f"インデックス {idx} の曲が songs.csv にありません。")
 
     def select_song_by_index(self, idx: int) -> bool:
-        found = None
-        for r in self.songs:
-            try:
-                if int(r.get("song_index", -1)) == idx:
-                    found = r
-                    break
-            except Exception:
-                continue
+        found = self._song_by_idx.get(idx)
         if not found:
             return False
 
         name = (found.get("song_name") or "").strip()
-        bpb = safe_int(found.get("beats_per_bar"), 4)
-        bu = safe_int(found.get("beat_unit"), 4)
+        bpb = found["_bpb_int"]
+        bu = found["_bu_int"]
 
         self.selected_song_index = idx
         self.selected_song_name = name
         self.selected_beats_per_bar = bpb
         self.selected_beat_unit = bu
 
-        self.selected_label.configure(text=f"選択中: [{idx}] {name} ({bpb}/{bu})")
+        # 曲の表記は選択時に1回だけ組み立て、選択表示と開始ログで使い回す
+        self._selected_desc = f"[{idx}] {name} ({bpb}/{bu})"
+        self.selected_label.configure(text=f"選択中: {self._selected_desc}")
         self.meter_label.configure(text=f"拍子: {bpb}/{bu}")
 
         # highlight if visible
@@ -854,11 +1257,92 @@ class PracticeTracker(tk.Tk):
 
     # ---------- sessions cache ----------
     def load_sessions(self):
-        self.sessions = read_csv_rows(SESSIONS_CSV)
-
-    def reload_sessions(self):
-        self.load_sessions()
-        self._update_suggestion()
+        if self._session_writes:
+            return  # 追記待ちの行がある間は、メモリ上の sessions のほうが新しい
+        key = file_key(SESSIONS_CSV)
+        if key is not None and key == self._sessions_key:
+            return  # sessions.csv に変更なし
+
+        cached = load_pickle_cache(SESSIONS_CACHE, SESSIONS_CACHE_VERSION, key) if key is not None else None
+        if cached is not None:
+            self.sessions, self._sess_cols, self._sess_by_song = cached
+            self._cache_key = key
+        else:
+            self.sessions = read_csv_rows(SESSIONS_CSV)
+            self._build_session_columns()
+        self._sessions_key = key
+        self._save_sessions_cache()
+        self._sessions_gen += 1
+
+    def _save_sessions_cache(self):
+        """メモリ上の sessions がファイル（_sessions_key）と一致していて、pkl が古ければ書き直す"""
+        key = self._sessions_key
+        if key is None or key == self._cache_key or self._session_writes:
+            return
+        data = (self.sessions, self._sess_cols, self._sess_by_song)
+        save_pickle_cache(SESSIONS_CACHE, SESSIONS_CACHE_VERSION, key, data)
+        self._cache_key = key
+
+    def _build_session_columns(self):
+        """提案計算用に、sessions の数値列を読み込み時に1回だけ int 化しておく（行番号で対応）"""
+        parsed = [session_numbers(r) for r in self.sessions]
+        cols = [list(c) for c in zip(*parsed)] or [[] for _ in SESSION_COLS]
+        self._sess_cols = dict(zip(SESSION_COLS, cols))
+
+        # 曲ごとに bar_start 昇順の (bar_start列, 行番号列) を作っておき、bisect で候補を絞る
+        si, bs_c = self._sess_cols["song_index"], self._sess_cols["bar_start"]
+        by_song: dict[int, list[int]] = {}
+        for i, idx in enumerate(si):
+            if idx != -1:
+                by_song.setdefault(idx, []).append(i)
+        self._sess_by_song: dict[int, tuple[list[int], list[int]]] = {}
+        for idx, rows in by_song.items():
+            rows.sort(key=bs_c.__getitem__)
+            self._sess_by_song[idx] = ([bs_c[i] for i in rows], rows)
+
+    def _add_session(self, row: dict):
+        """保存した1行を、sessions.csv を読み直さずに sessions / 列 / 索引へ足す"""
+        i = len(self.sessions)
+        self.sessions.append(row)
+        nums = session_numbers(row)
+        for name, v in zip(SESSION_COLS, nums):
+            self._sess_cols[name].append(v)
+        idx, bs = nums[0], nums[1]
+        if idx != -1:
+            bs_sorted, rows = self._sess_by_song.setdefault(idx, ([], []))
+            pos = bisect_right(bs_sorted, bs)  # 同じ bar_start の中ではファイル順（末尾）
+            bs_sorted.insert(pos, bs)
+            rows.insert(pos, i)
+        self._sessions_gen += 1
+
+    def _submit_session_write(self, values: tuple):
+        fut = self._io_executor.submit(self._write_session, values)
+        self._session_writes.append(fut)
+        # 完了通知は I/O スレッドで呼ばれるので、処理は after で Tk スレッドへ渡す
+        fut.add_done_callback(lambda f: self.after(0, self._on_session_written, f))
+
+    def _write_session(self, values: tuple) -> tuple[int, int] | None:
+        # I/Oスレッドで実行（Tkウィジェットにも self の状態にも触らない）
+        self._sessions_appender.append(values)
+        return file_key(SESSIONS_CSV)
+
+    def _on_session_written(self, fut):
+        self._session_writes.remove(fut)
+        err = fut.exception()
+        if err is not None:
+            self._resync_sessions = True
+            self.log_append(f"!!! 保存に失敗しました: {err}\n-> {SESSIONS_CSV}\n")
+            self._show_inline_error(f"保存に失敗しました: {err}")
+        if self._session_writes:
+            return
+        if self._resync_sessions:
+            # 書けなかった行はファイルに無いので、ファイルから読み直して表示も合わせる
+            self._resync_sessions = False
+            self._sessions_key = None
+            self._update_suggestion()
+        else:
+            # 追記後のファイルを「読み込み済み」とする（メモリ上には _add_session で反映済み）
+            self._sessions_key = fut.result()
 
     # ---------- metronome preview ----------
     def _get_preview_params(self):
@@ -866,9 +1350,15 @@ class PracticeTracker(tk.Tk):
         bpm = safe_int(bpm_s, 0)
         if bpm <= 0:
             return None
-        bpb = int(getattr(self, "selected_beats_per_bar", 4) or 4)
+        bpb = self.selected_beats_per_bar
         return bpm, bpb
 
+    def _set_preview_text(self, text: str):
+        if self._preview_text == text:
+            return
+        self.preview_btn.configure(text=text)
+        self._preview_text = text
+
     def toggle_preview_metronome(self):
         # 練習中は試聴トグルしない（常時鳴らしているため）
         if self.active:
@@ -876,18 +1366,18 @@ class PracticeTracker(tk.Tk):
 
         if self.metro.is_running():
             self.metro.stop()
-            self.preview_btn.configure(text="試聴 ▶")
-            self.status_label.configure(text="状態: 待機中（曲→小節→提案→BPM→開始）")
+            self._set_preview_text("試聴 ▶")
+            self._set_status("状態: 待機中（曲→小節→提案→BPM→開始）")
             return
 
         params = self._get_preview_params()
         if params is None:
-            messagebox.showerror("試聴できません", "BPMを入力してください（整数）。")
+            show_error("試聴できません", "BPMを入力してください（整数）。")
             return
 
         bpm, bpb = params
         self.metro.start(bpm=bpm, beats_per_bar=bpb)
-        self.preview_btn.configure(text="試聴 ■")
+        self._set_preview_text("試聴 ■")
 
     def _sync_preview_if_running(self):
         # 試聴中 or 練習中のテンポ変更（練習中はBPM入力欄がロックされるので基本呼ばれない）
@@ -899,7 +1389,27 @@ class PracticeTracker(tk.Tk):
         bpm, bpb = params
         self.metro.update(bpm=bpm, beats_per_bar=bpb)
 
+    def _schedule_preview_sync(self):
+        # BPM入力中は連打ごとに鳴らし直さず、入力が止まってから反映（短めにしてテンポ変更は即時に近く）
+        if self._preview_after_id is not None:
+            self.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.after(50, self._run_scheduled_preview_sync)
+
+    def _run_scheduled_preview_sync(self):
+        self._preview_after_id = None
+        self._sync_preview_if_running()
+
     # ---------- suggestion logic ----------
+    def _schedule_suggestion(self):
+        # 小節入力中は、入力が止まってから1回だけ提案を計算する
+        if self._suggest_after_id is not None:
+            self.after_cancel(self._suggest_after_id)
+        self._suggest_after_id = self.after(150, self._run_scheduled_suggestion)
+
+    def _run_scheduled_suggestion(self):
+        self._suggest_after_id = None
+        self._update_suggestion()
+
     def _parse_bar_inputs(self):
         s1 = self.bar_start_var.get().strip()
         s2 = self.bar_end_var.get().strip()
@@ -923,58 +1433,39 @@ class PracticeTracker(tk.Tk):
         - suggested_bpm_value: int|None
         - details: str
         """
-        rows = []
-        for r in self.sessions:
-            if safe_int(r.get("song_index"), -1) != song_index:
-                continue
-
-            bs = safe_int(r.get("bar_start"), None)
-            be = safe_int(r.get("bar_end"), None)
-            if bs is None or be is None:
-                continue
-            if bs > be:
-                bs, be = be, bs
+        c = self._sess_cols
+        bs_c, be_c = c["bar_start"], c["bar_end"]
+        reps_c, succ_c, bpm_c = c["reps"], c["success"], c["bpm"]
 
-            if overlap(t_start, t_end, bs, be):
-                rows.append(r)
+        # bar_start <= t_end の範囲だけ見て、bar_end >= t_start のものを残す
+        bs_sorted, rows_sorted = self._sess_by_song.get(song_index, ((), ()))
+        cut = bisect_right(bs_sorted, t_end)
+        hits = sorted(i for i in rows_sorted[:cut] if be_c[i] >= t_start)
 
-        if not rows:
+        if not hits:
             return {
                 "kind": "none",
                 "suggested_bpm_value": None,
                 "details": "過去ログがありません（この曲・この小節に重なる記録なし）",
             }
 
+        # 90%達成した行だけ、重なる小節の最小BPMを更新する
         achieved_per_bar = {}
-        for bar in range(t_start, t_end + 1):
-            best_min_bpm = None
-            for r in rows:
-                bs = safe_int(r.get("bar_start"), 0)
-                be = safe_int(r.get("bar_end"), 0)
-                if bs > be:
-                    bs, be = be, bs
-                if not (bs <= bar <= be):
-                    continue
-
-                reps = safe_int(r.get("reps"), 0)
-                succ = safe_int(r.get("success"), 0)
-                if reps <= 0:
-                    continue
-                acc = succ / reps
-                bpm = safe_int(r.get("bpm"), 0)
-                if bpm <= 0:
-                    continue
-                if acc >= SUCCESS_THRESHOLD:
-                    if best_min_bpm is None or bpm < best_min_bpm:
-                        best_min_bpm = bpm
-
-            if best_min_bpm is not None:
-                achieved_per_bar[bar] = best_min_bpm
+        for i in hits:
+            reps = reps_c[i]
+            bpm = bpm_c[i]
+            if reps <= 0 or bpm <= 0 or succ_c[i] / reps < SUCCESS_THRESHOLD:
+                continue
+            for bar in range(max(t_start, bs_c[i]), min(t_end, be_c[i]) + 1):
+                cur = achieved_per_bar.get(bar)
+                if cur is None or bpm < cur:
+                    achieved_per_bar[bar] = bpm
 
         if achieved_per_bar:
             suggested = min(achieved_per_bar.values())
-            bottlenecks = [b for b, v in achieved_per_bar.items() if v == suggested]
-            missing = [b for b in range(t_start, t_end + 1) if b not in achieved_per_bar]
+            bar_range = range(t_start, t_end + 1)
+            bottlenecks = [b for b in bar_range if achieved_per_bar.get(b) == suggested]
+            missing = [b for b in bar_range if b not in achieved_per_bar]
             bn_str = ",".join(map(str, bottlenecks[:10])) + ("…" if len(bottlenecks) > 10 else "")
             detail = f"提案BPM（90%達成ログより）: {suggested}  | ボトルネック小節: {bn_str}"
             if missing:
@@ -986,25 +1477,19 @@ class PracticeTracker(tk.Tk):
                 "details": detail,
             }
 
-        parsed = []
-        for r in rows:
-            ts = parse_timestamp(r.get("timestamp_start") or "")
-            if ts is None:
-                continue
-            parsed.append((ts, r))
+        ts_c = c["ts"]
+        parsed = [(ts_c[i], i) for i in hits if ts_c[i] is not None]
         if not parsed:
-            parsed = [(datetime.min, r) for r in rows]
+            parsed = [(datetime.min, i) for i in hits]
 
         max_ts = max(ts for ts, _ in parsed)
-        latest_group = [r for ts, r in parsed if ts == max_ts]
 
         chosen = None
-        for r in latest_group:
-            bpm = safe_int(r.get("bpm"), 0)
-            if bpm <= 0:
+        for ts, i in parsed:
+            if ts != max_ts or bpm_c[i] <= 0:
                 continue
-            if chosen is None or bpm < safe_int(chosen.get("bpm"), 10**9):
-                chosen = r
+            if chosen is None or bpm_c[i] < bpm_c[chosen]:
+                chosen = i
 
         if chosen is None:
             return {
@@ -1013,13 +1498,13 @@ class PracticeTracker(tk.Tk):
                 "details": "重なる過去ログはありますが、BPM/回数が不正で提案できません。",
             }
 
-        reps = safe_int(chosen.get("reps"), 0)
-        succ = safe_int(chosen.get("success"), 0)
-        acc = (succ / reps) if reps > 0 else 0.0
-        bpm = safe_int(chosen.get("bpm"), 0)
-        ts_s = (chosen.get("timestamp_start") or "").strip()
-        bs = safe_int(chosen.get("bar_start"), 0)
-        be = safe_int(chosen.get("bar_end"), 0)
+        reps = reps_c[chosen]
+        acc = (succ_c[chosen] / reps) if reps > 0 else 0.0
+        bpm = bpm_c[chosen]
+        row = self.sessions[chosen]
+        ts_s = (row.get("timestamp_start") or "").strip()
+        bs = safe_int(row.get("bar_start"), 0)
+        be = safe_int(row.get("bar_end"), 0)
         detail = (
             "90%達成ログがありません。\n"
             f"直近の練習（遅いほう）: BPM {bpm} / 正解率 {acc:.1%} / 日時 {ts_s} / 区間 {bs}-{be}"
@@ -1049,7 +1534,14 @@ class PracticeTracker(tk.Tk):
 
         t1, t2 = bars
         self.load_sessions()
-        res = self._compute_suggestion(int(self.selected_song_index), t1, t2)
+        # 入力もメモリ上の sessions も前回と同じなら計算し直さない
+        key = (self.selected_song_index, t1, t2, self._sessions_gen)
+        if key == self._suggest_key:
+            res = self._suggest_res
+        else:
+            res = self._compute_suggestion(*key[:3])
+            self._suggest_key = key
+            self._suggest_res = res
 
         self.suggestion_label.configure(text=f"提案: {res['details']}")
         self._last_suggested_bpm = res["suggested_bpm_value"]
@@ -1061,15 +1553,29 @@ class PracticeTracker(tk.Tk):
     def apply_suggested_bpm(self):
         if self.active:
             return
-        if getattr(self, "_last_suggested_bpm", None) is None:
+        if self._last_suggested_bpm is None:
             return
         self.bpm_var.set(str(self._last_suggested_bpm))
         self._sync_preview_if_running()
 
     # ---------- session state ----------
+    def _set_status(self, text: str):
+        if self._status_err_after_id is not None:
+            self.after_cancel(self._status_err_after_id)
+            self._status_err_after_id = None
+        self._status_text = text
+        self.status_label.configure(text=text, foreground="")
+
+    def _show_inline_error(self, msg: str):
+        # 開始/保存時の入力ミスはモーダルを出さず、状態欄に赤字で出して5秒後に戻す
+        if self._status_err_after_id is not None:
+            self.after_cancel(self._status_err_after_id)
+        self.status_label.configure(text=msg, foreground="red")
+        self._status_err_after_id = self.after(5000, lambda: self._set_status(self._status_text))
+
     def _set_idle_state(self):
         self.active = False
-        self.status_label.configure(text="状態: 待機中（曲→小節→提案→BPM→開始）")
+        self._set_status("状態: 待機中（曲→小節→提案→BPM→開始）")
 
         self.start_btn.configure(state="normal")
         self.finish_btn.configure(state="disabled")
@@ -1091,7 +1597,7 @@ class PracticeTracker(tk.Tk):
         self._update_counter_labels()
 
         if not self.metro.is_running():
-            self.preview_btn.configure(text="試聴 ▶")
+            self._set_preview_text("試聴 ▶")
 
     def _set_active_state(self):
         self.active = True
@@ -1110,7 +1616,7 @@ class PracticeTracker(tk.Tk):
         self.succ_minus.configure(state="normal")
         self.reset_counts_btn.configure(state="normal")
 
-        self.status_label.configure(text=f"状態: 計測中… session_id={self.session_id}")
+        self._set_status(f"状態: 計測中… session_id={self.session_id}")
 
     def _validate_before_start(self):
         if self.selected_song_index is None or not self.selected_song_name:
@@ -1133,29 +1639,29 @@ class PracticeTracker(tk.Tk):
         bpm_s = self.bpm_var.get().strip()
         if not bpm_s:
             raise ValueError("BPMを入力してください（開始前に必須）。")
-        try:
-            bpm = int(bpm_s)
-        except Exception:
+        # isdigit は '²' 等も通して int() が落ちるので isdecimal で判定（例外を使わない）
+        if not bpm_s.isdecimal():
             raise ValueError("BPMは整数で入力してください。")
-        if bpm <= 0 or bpm > 400:
+        bpm = int(bpm_s)
+        if not 1 <= bpm <= 400:
             raise ValueError("BPMは 1〜400 の整数で入力してください。")
 
         return bar_start, bar_end, bpm
 
     def start_session(self):
-        if self.active:
+        if self.active or self._closing:
             return
         try:
             bar_start, bar_end, bpm = self._validate_before_start()
         except ValueError as e:
-            messagebox.showerror("開始できません", str(e))
+            self._show_inline_error(f"開始できません: {e}")
             return
 
-        bpb = int(getattr(self, "selected_beats_per_bar", 4) or 4)
+        bpb = self.selected_beats_per_bar
 
         self.session_id = new_session_id()
         self.t_start_iso = now_iso()
-        self.t_start_epoch = time.time()
+        self.t_start_mono = time.monotonic()  # 経過時間用（時計合わせの影響を受けない）
 
         self.locked_bar_start = bar_start
         self.locked_bar_end = bar_end
@@ -1173,93 +1679,111 @@ class PracticeTracker(tk.Tk):
         else:
             self.metro.start(bpm=bpm, beats_per_bar=bpb)
 
-        self.preview_btn.configure(text="試聴 ■")
-
-        self.log_append(
-            f"\n=== 開始 [{self.session_id}] 曲=[{self.selected_song_index}] {self.selected_song_name} "
-            f"({bpb}/{self.selected_beat_unit}) 小節={bar_start}-{bar_end} BPM={bpm} ===\n"
-        )
-
-    def cancel_session(self):
-        if not self.active:
-            return
-
-        self.log_append(f"=== 中断（保存しない） session_id={self.session_id} ===\n")
+        self._set_preview_text("試聴 ■")
 
-        self.metro.stop()
-        self.preview_btn.configure(text="試聴 ▶")
+        self.log_append("".join((
+            "\n=== 開始 [", self.session_id, "] 曲=", self._selected_desc,
+            " 小節=", str(bar_start), "-", str(bar_end), " BPM=", str(bpm), " ===\n",
+        )))
 
+    def _reset_session_state(self):
+        # 中断/保存の両方で使う（表示の更新は呼び出し側の _set_idle_state で行う）
         self.session_id = None
         self.t_start_iso = None
-        self.t_start_epoch = None
+        self.t_start_mono = None
         self.locked_bar_start = None
         self.locked_bar_end = None
         self.locked_bpm = None
         self.reps = 0
         self.success = 0
 
-        self._set_idle_state()
+    def cancel_session(self):
+        if not self.active:
+            return
+
+        self.log_append(f"=== 中断（保存しない） session_id={self.session_id} ===\n")
+
+        self.metro.stop()
+        self._set_preview_text("試聴 ▶")
+
+        self._reset_session_state()
+        self._set_idle_state()  # カウンター表示の更新もここで1回
         self._update_suggestion()
 
     def finish_and_save(self):
         if not self.active:
             return
         if self.reps <= 0:
-            messagebox.showerror("保存できません", "回数が0です。最低1回はカウントしてください。")
+            self._show_inline_error("保存できません: 回数が0です。最低1回はカウントしてください。")
             return
 
         self.success = min(self.success, self.reps)
 
         t_end_iso = now_iso()
-        duration = time.time() - float(self.t_start_epoch or time.time())
+        duration = time.monotonic() - self.t_start_mono
 
+        # 型は start_session / select_song_by_index の時点で確定している（-O では assert ごと消える）
+        assert isinstance(self.selected_song_index, int) and isinstance(self.locked_bpm, int)
         row = SessionRow(
-            session_id=str(self.session_id),
-            timestamp_start=str(self.t_start_iso),
+            session_id=self.session_id,
+            timestamp_start=self.t_start_iso,
             timestamp_end=t_end_iso,
             duration_sec=round(duration, 3),
-            song_index=int(self.selected_song_index),
-            song_name=str(self.selected_song_name),
-            bar_start=int(self.locked_bar_start),
-            bar_end=int(self.locked_bar_end),
-            bpm=int(self.locked_bpm),
-            reps=int(self.reps),
-            success=int(self.success),
+            song_index=self.selected_song_index,
+            song_name=self.selected_song_name,
+            bar_start=self.locked_bar_start,
+            bar_end=self.locked_bar_end,
+            bpm=self.locked_bpm,
+            reps=self.reps,
+            success=self.success,
             note=self.note_var.get(),
         )
 
-        append_csv(SESSIONS_CSV, SESSIONS_FIELDS, asdict(row))
+        values = session_row_values(row)
+        self._add_session(dict(zip(SESSIONS_FIELDS, map(str, values))))
+        self._submit_session_write(values)
 
         rate = (self.success / self.reps) if self.reps else 0.0
-        self.log_append(
-            f"=== 保存しました ===\n"
-            f"時間 {row.duration_sec:.1f}s / 回数 {row.reps} / 成功 {row.success} / 正解率 {rate:.1%}\n"
-            f"-> {SESSIONS_CSV}\n"
-        )
+        self.log_append("".join((
+            "=== 保存しました ===\n時間 ", f"{row.duration_sec:.1f}", "s / 回数 ", str(row.reps),
+            " / 成功 ", str(row.success), " / 正解率 ", f"{rate:.1%}", "\n", _LOG_SAVED_TO,
+        )))
 
         self.metro.stop()
-        self.preview_btn.configure(text="試聴 ▶")
-
-        self.session_id = None
-        self.t_start_iso = None
-        self.t_start_epoch = None
-        self.locked_bar_start = None
-        self.locked_bar_end = None
-        self.locked_bpm = None
-        self.reps = 0
-        self.success = 0
+        self._set_preview_text("試聴 ▶")
 
-        self._set_idle_state()
-        self.reload_sessions()
+        self._reset_session_state()
+        self._set_idle_state()  # カウンター表示の更新もここで1回
+        self._update_suggestion()
 
     # ---------- counters ----------
     def _update_counter_labels(self):
-        self.reps_label.configure(text=f"回数: {self.reps}")
-        self.success_label.configure(text=f"成功: {self.success}")
+        # 値が前回描画と同じなら何もしない（割り算/書式化もしない）
+        key = (self.reps, self.success)
+        if key == self._last_counter_key:
+            return
+        self._last_counter_key = key
+        # 連打されても、描画はアイドル時に1回だけ
+        if self._labels_dirty:
+            return
+        self._labels_dirty = True
+        self.after_idle(self._flush_counter_labels)
+
+    def _flush_counter_labels(self):
+        self._labels_dirty = False
+        self._set_label("reps", self.reps_label, f"回数: {self.reps}")
+        self._set_label("success", self.success_label, f"成功: {self.success}")
         if self.reps > 0:
-            self.rate_label.configure(text=f"正解率: {self.success / self.reps:.1%}")
+            self._set_label("rate", self.rate_label, f"正解率: {self.success / self.reps:.1%}")
         else:
-            self.rate_label.configure(text="正解率: -")
+            self._set_label("rate", self.rate_label, "正解率: -")
+
+    def _set_label(self, key: str, label: ttk.Label, text: str):
+        # 表示中と同じ文字列なら configure しない
+        if self._last_text[key] == text:
+            return
+        label.configure(text=text)
+        self._last_text[key] = text
 
     def add_rep(self, delta: int):
         if not self.active:
@@ -1286,8 +1810,6 @@ class PracticeTracker(tk.Tk):
 
 
 if __name__ == "__main__":
-    ensure_songs_schema()
-    ensure_sessions_schema()
-
+    # スキーマ確認は PracticeTracker.__init__ で行う
     app = PracticeTracker()
     app.mainloop()